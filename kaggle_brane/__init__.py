@@ -1,16 +1,19 @@
 # import shutil
-import io
 import json
 import os
+import time
 import traceback
-import zipfile
 from functools import wraps
 
+# the submodules and the kaggle sdk are imported where they are needed to
+# keep the startup of run.py cheap for commands that do not use them
+
 """
 implemented kaggle endpoints
-    - competitions {list, files, download, submit, submissions, leaderboard}
-    - datasets {list, files, download, create, version, init, metadata, status}
-    - kernels {list,init,push,pull,output,status}
+    - competitions {list, files, download, extract, submit, submissions, leaderboard}
+    - datasets {list, files, download, create, version, init, metadata, status, wait}
+    - kernels {list,init,push,pull,output,status,wait}
+    - manifest {verify}
 
 not covered by this package as of now
     - config {view, set, unset}
@@ -29,6 +32,164 @@ def _is_set(val):
     return str(val).lower() in ["y", "yes", "true", "t"]
 
 
+def _split_ref(api, ref, validate):
+    if "/" in ref:
+        validate(ref)
+        owner_slug, slug = ref.split("/")[:2]
+        return owner_slug, slug
+    return api.get_config_value(api.CONFIG_NAME_USER), ref
+
+
+def _redirect_name(response):
+    url = response.retries.history[0].redirect_location
+    return url.split("?")[0].split("/")[-1]
+
+
+def _download_cache(env):
+    cache_dir = env.get("CACHE_DIR")
+    if not cache_dir:
+        return None
+    max_size = int(env.get("CACHE_MAX_SIZE", 0)) or None
+    from .cache import DownloadCache
+
+    return DownloadCache(cache_dir, max_size=max_size)
+
+
+def _cache_output(download_cache):
+    if download_cache is None:
+        return dict()
+    return dict(cache=download_cache.stats())
+
+
+def _downloader(api, env):
+    from . import download
+
+    return download.Downloader(
+        api,
+        download_cache=_download_cache(env),
+        force=_is_set(env.get("FORCE", "")),
+        chunk_size=int(env.get("CHUNK_SIZE", download.DEFAULT_CHUNK_SIZE)),
+        segments=int(env.get("DOWNLOAD_SEGMENTS", 1)),
+        segment_size=int(env.get("SEGMENT_SIZE", download.DEFAULT_SEGMENT_SIZE)),
+        retries=int(env.get("DOWNLOAD_RETRIES", 3)),
+        verify_zip=_is_set(env.get("VERIFY_ZIP", "")),
+    )
+
+
+def _convert(env, dest, output):
+    fmt = env.get("CONVERT")
+    if not fmt:
+        return
+    from . import convert
+
+    report = convert.convert(
+        dest,
+        fmt=fmt.lower(),
+        workers=int(env.get("CONVERT_WORKERS", 0)) or os.cpu_count(),
+        block_size=int(env.get("CONVERT_BLOCK_SIZE", convert.DEFAULT_BLOCK_SIZE)),
+        keep=_is_set(env.get("KEEP_CSV", "true")),
+    )
+    output.update(conversion=report)
+    failed = convert.failed(report)
+    if failed:
+        raise PartialError(
+            "failed to convert %s" % ", ".join(f["file"] for f in failed), output
+        )
+
+
+def _single_flight(env, dest, name, options, work):
+    # processes downloading the same target to dest run one after the other,
+    # those that waited for one with the same options reuse its output
+    # instead of downloading and extracting it again
+    if not _is_set(env.get("SINGLE_FLIGHT", "true")):
+        return work()
+    import hashlib
+
+    from . import lock, output
+
+    key = json.dumps([env.get(option) for option in options])
+    result, report = lock.single_flight(
+        os.path.join(dest, lock.DIRECTORY, name),
+        lambda: output.to_plain(work()),
+        key=hashlib.sha1(key.encode("utf-8")).hexdigest(),
+        stale=float(env.get("LOCK_STALE", lock.DEFAULT_STALE)),
+        timeout=float(env.get("LOCK_TIMEOUT", 0)) or None,
+    )
+    return dict(result, lock=report)
+
+
+def _write_manifest(env, dest, ref):
+    if not _is_set(env.get("WRITE_MANIFEST", "")):
+        return dict()
+    from . import manifest
+
+    workers = int(env.get("HASH_WORKERS", 8))
+    return dict(manifest=manifest.write(dest, ref, workers=workers))
+
+
+def _uploader(api, env, **options):
+    from .upload import Uploader
+
+    return Uploader(
+        api,
+        workers=int(env.get("UPLOAD_WORKERS", 8)),
+        chunk_size=int(env.get("CHUNK_SIZE", 1 << 20)),
+        retries=int(env.get("UPLOAD_RETRIES", 3)),
+        **options
+    )
+
+
+def _paginate(env, fetch, page):
+    # with ALL_PAGES or MAX_ITEMS, list functions return a generator that is
+    # streamed out item by item instead of a single page
+    max_items = env.get("MAX_ITEMS")
+    if not _is_set(env.get("ALL_PAGES", "")) and max_items is None:
+        return fetch(page)
+    from .paging import iter_pages
+
+    max_items = int(max_items) if max_items is not None else None
+    return iter_pages(fetch, start=page, max_items=max_items)
+
+
+def _cached(api, env, endpoint, fetch, *args):
+    from . import responses
+
+    # responses differ between accounts, e.g. the submissions
+    user = api.get_config_value(api.CONFIG_NAME_USER)
+    bypass = _is_set(env.get("CACHE_BYPASS", ""))
+    return responses.cached(env, endpoint, [user, *args], fetch, bypass=bypass)
+
+
+def _targets(api, env, single, multiple, validate):
+    refs = [ref.strip() for ref in env.get(multiple, "").split(",") if ref.strip()]
+    if env.get(single):
+        refs.append(env[single])
+    # "slug" and "user/slug" name the same target and are polled once
+    return list(dict.fromkeys("/".join(_split_ref(api, r, validate)) for r in refs))
+
+
+def _list(env, name):
+    return [item.strip() for item in env.get(name, "").split(",") if item.strip()]
+
+
+def _wait(env, kind, targets, poll):
+    from . import watch
+
+    timeout = env.get("TIMEOUT")
+    output = watch.wait(
+        targets,
+        poll,
+        watch.TERMINAL[kind],
+        mode=env.get("WAIT_FOR", "all"),
+        timeout=float(timeout) if timeout is not None else None,
+        initial=float(env.get("POLL_INTERVAL", 1)),
+        maximum=float(env.get("MAX_POLL_INTERVAL", 60)),
+    )
+    if output["timed_out"]:
+        raise PartialError("timed out after %s seconds" % timeout, output)
+    return output
+
+
 def create_kaggle_json_file(username, key):
     kaggle_json = {"username": username, "key": key}
     kaggle_json_file = os.path.join(os.environ["HOME"], ".kaggle/kaggle.json")
@@ -45,25 +206,54 @@ def authenticate(env):
     )
     from kaggle.api.kaggle_api_extended import KaggleApi
 
-    api = KaggleApi()
-    api.authenticate()
+    from .metrics import phase
+    from .pool import tune
+    from .scheduler import install
+
+    with phase("auth"):
+        api = KaggleApi()
+        api.authenticate()
+    if env.get("API_HOST"):
+        # e.g. a local stand-in for the api
+        api.api_client.configuration.host = env["API_HOST"]
+    tune(api, env)
+    install(api, env)
     return api
 
 
+class PartialError(Exception):
+    """failure that still produced output worth reporting"""
+
+    def __init__(self, message, output):
+        super().__init__(message)
+        self.output = output
+
+
 def wrap_error(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        from . import metrics
+
+        # functions are called with (api, env)
+        env = args[1] if len(args) > 1 else dict()
         try:
-            return True, f(*args, **kwargs), ""
-        except Exception:
+            with metrics.call(env):
+                return True, f(*args, **kwargs), ""
+        except Exception as e:
             if DEBUG:
                 raise
             trace = traceback.format_exc()
-            return False, None, trace
+            return False, getattr(e, "output", None), trace
 
     return decorated
 
 
+def offline(f):
+    """marks functions that can be run without an authenticated api"""
+    f.requires_api = False
+    return f
+
+
 @wrap_error
 def list_competitions(api, env):
     competition = env.get("COMPETITION")
@@ -75,9 +265,13 @@ def list_competitions(api, env):
     sort_by = env.get("SORT_BY")
     page = int(env.get("PAGE", 1))
     search = env.get("SEARCH")
-    return api.competitions_list(
-        group=group, category=category, sort_by=sort_by, page=page, search=search
-    )
+
+    def fetch(page):
+        return api.competitions_list(
+            group=group, category=category, sort_by=sort_by, page=page, search=search
+        )
+
+    return _paginate(env, fetch, page)
 
 
 @wrap_error
@@ -85,7 +279,13 @@ def list_competition_files(api, env):
     competition = env.get("COMPETITION")
     if competition is None:
         raise ValueError("must specify competition")
-    return api.competition_list_files(competition)
+    return _cached(
+        api,
+        env,
+        "list_competition_files",
+        lambda: api.competition_list_files(competition),
+        competition,
+    )
 
 
 @wrap_error
@@ -93,38 +293,92 @@ def download_competition(api, env):
     comp = env.get("COMPETITION")
     if comp is None:
         raise ValueError("must specify competition")
-    # optional
     dest = os.path.realpath(env.get("DESTINATION", "."))
+    return _single_flight(
+        env,
+        dest,
+        "competitions-" + comp,
+        ["UNZIP", "LAZY", "INCLUDE", "EXCLUDE", "CONVERT", "WRITE_MANIFEST"],
+        lambda: _download_competition(api, env, comp, dest),
+    )
+
+
+def _download_competition(api, env, comp, dest):
     force = _is_set(env.get("FORCE", ""))
     unzip = _is_set(env.get("UNZIP", "true"))
     quiet = _is_set(env.get("QUIET", ""))
     quiet = True
+    from . import archive
+
+    buffer_size = int(env.get("BUFFER_SIZE", archive.DEFAULT_BUFFER_SIZE))
+    workers = int(env.get("EXTRACT_WORKERS", 1)) or os.cpu_count()
+    downloader = _downloader(api, env)
     if DEBUG:
         print(
             "downloading %s to %s (force=%s, unzip=%s quiet=%s)"
             % (comp, dest, force, unzip, quiet)
         )
-    api.competition_download_files(comp, path=dest, force=force, quiet=quiet)
+    response = api.process_response(
+        api.competitions_data_download_files_with_http_info(
+            id=comp, _preload_content=False
+        )
+    )
+    outfile = os.path.join(dest, comp + ".zip")
+    ref = "competitions/" + comp
+    downloader.fetch(response, outfile, ref)
     assert comp + ".zip" in os.listdir(dest)
-    if unzip:
+    output = _cache_output(downloader.cache)
+    if unzip and _is_set(env.get("LAZY", "")):
+        # files are extracted on request by "competitions extract"
+        lazy = archive.LazyArchive(outfile, dest)
+        output.update(extraction=dict(lazy=True, names=lazy.names()))
+    elif unzip:
         # recursively unzip the files
-        archive = os.path.join(dest, comp + ".zip")
+        zipped = os.path.join(dest, comp + ".zip")
         # to put all files into a subfolder, unarchived can be used instead of dest
         # unarchived = os.path.join(dest, comp)
         # os.makedirs(unarchived, exist_ok=True)
-        _extract(archive, dest)
-
+        report = archive.extract(
+            zipped,
+            dest,
+            buffer_size=buffer_size,
+            workers=workers,
+            zero_copy=_is_set(env.get("ZERO_COPY", "")),
+            include=_list(env, "INCLUDE"),
+            exclude=_list(env, "EXCLUDE"),
+        )
+        output.update(extraction=report)
+        failed = archive.failed(report)
+        if failed:
+            raise PartialError(
+                "failed to extract %s" % ", ".join(m["member"] for m in failed),
+                output,
+            )
+    _convert(env, dest, output)
+    output.update(_write_manifest(env, dest, ref))
+    return output
+
+
+@offline
+@wrap_error
+def extract_competition(api, env):
+    comp = env.get("COMPETITION")
+    if comp is None:
+        raise ValueError("must specify competition")
+    names = _list(env, "FILES")
+    if not names:
+        raise ValueError("must specify files")
+    # optional
+    dest = os.path.realpath(env.get("DESTINATION", "."))
+    from . import archive
 
-def _extract(filename, dest):
-    z = zipfile.ZipFile(filename)
-    for f in z.namelist():
-        dirname = os.path.splitext(f)[0]
-        unarchived = os.path.join(dest, dirname)
-        os.makedirs(unarchived, exist_ok=True)
-        content = io.BytesIO(z.read(f))
-        zip_file = zipfile.ZipFile(content)
-        for ff in zip_file.namelist():
-            zip_file.extract(ff, unarchived)
+    lazy = archive.LazyArchive(
+        os.path.join(dest, comp + ".zip"),
+        dest,
+        buffer_size=int(env.get("BUFFER_SIZE", archive.DEFAULT_BUFFER_SIZE)),
+        zero_copy=_is_set(env.get("ZERO_COPY", "")),
+    )
+    return dict(files={name: lazy.path(name) for name in names})
 
 
 @wrap_error
@@ -149,7 +403,39 @@ def competition_submissions(api, env):
     competition = env.get("COMPETITION")
     if competition is None:
         raise ValueError("must specify competition")
-    return api.competition_submissions(competition)
+    return _cached(
+        api,
+        env,
+        "competition_submissions",
+        lambda: api.competition_submissions(competition),
+        competition,
+    )
+
+
+def _download_leaderboard(api, env, competition, dest):
+    from .leaderboard import Leaderboard
+
+    # the sdk's competition_leaderboard_download writes <competition>.zip,
+    # which would overwrite the data of the competition
+    response = api.process_response(
+        api.competition_download_leaderboard_with_http_info(
+            competition, _preload_content=False
+        )
+    )
+    outfile = os.path.join(dest, competition + "-leaderboard.zip")
+    _downloader(api, env).fetch(response, outfile, "leaderboards/" + competition)
+    descending = env.get("ORDER", "desc").lower() != "asc"
+    board = Leaderboard.load(outfile, descending=descending)
+    output = dict(
+        file=outfile, teams=len(board), top=board.top(int(env.get("TOP") or 10))
+    )
+    team = env.get("TEAM")
+    if team:
+        output.update(rank=board.rank(team))
+    bins = int(env.get("HISTOGRAM") or 0)
+    if bins:
+        output.update(histogram=board.histogram(bins))
+    return output
 
 
 @wrap_error
@@ -160,15 +446,17 @@ def competition_leaderboard(api, env):
 
     # optional
     download = _is_set(env.get("DOWNLOAD", ""))
-    quiet = _is_set(env.get("QUIET", ""))
-    quiet = True
-    dest = env.get("DESTINATION")
+    dest = os.path.realpath(env.get("DESTINATION", "."))
 
     if download:
-        # this does not work because of
-        api.competition_leaderboard_download(competition, path=dest, quiet=quiet)
-        return None
-    return api.competition_leaderboard_view(competition)
+        return _download_leaderboard(api, env, competition, dest)
+    return _cached(
+        api,
+        env,
+        "competition_leaderboard",
+        lambda: api.competition_leaderboard_view(competition),
+        competition,
+    )
 
 
 @wrap_error
@@ -186,19 +474,22 @@ def list_dataset(api, env):
     max_size = int(env.get("MAX_SIZE", 100000))
     min_size = int(env.get("MIN_SIZE", 0))
 
-    return api.dataset_list(
-        sort_by=sort_by,
-        size=size,
-        file_type=file_type,
-        license_name=license_name,
-        tag_ids=tag_ids,
-        search=search,
-        user=user,
-        mine=mine,
-        page=page,
-        max_size=max_size,
-        min_size=min_size,
-    )
+    def fetch(page):
+        return api.dataset_list(
+            sort_by=sort_by,
+            size=size,
+            file_type=file_type,
+            license_name=license_name,
+            tag_ids=tag_ids,
+            search=search,
+            user=user,
+            mine=mine,
+            page=page,
+            max_size=max_size,
+            min_size=min_size,
+        )
+
+    return _paginate(env, fetch, page)
 
 
 @wrap_error
@@ -206,7 +497,13 @@ def list_dataset_files(api, env):
     dataset = env.get("DATASET")
     if dataset is None:
         raise ValueError("must specify dataset")
-    return api.dataset_list_files(dataset)
+    return _cached(
+        api,
+        env,
+        "list_dataset_files",
+        lambda: api.dataset_list_files(dataset),
+        dataset,
+    )
 
 
 @wrap_error
@@ -214,24 +511,127 @@ def download_dataset(api, env):
     dataset = env.get("DATASET")
     if dataset is None:
         raise ValueError("must specify dataset")
-
-    # optional
+    owner_slug, dataset_slug = _split_ref(api, dataset, api.validate_dataset_string)
     dest = env.get("DESTINATION")
+    if dest is None:
+        dest = api.get_default_download_dir("datasets", owner_slug, dataset_slug)
+    return _single_flight(
+        env,
+        dest,
+        "datasets-%s-%s" % (owner_slug, dataset_slug),
+        ["FILE_NAME", "FILE_PATTERN", "PER_FILE", "UNZIP", "CONVERT", "WRITE_MANIFEST"],
+        lambda: _download_dataset(api, env, owner_slug, dataset_slug, dest),
+    )
+
+
+def _download_dataset(api, env, owner_slug, dataset_slug, dest):
+    dataset = "%s/%s" % (owner_slug, dataset_slug)
     file_name = env.get("FILE_NAME")
     unzip = _is_set(env.get("UNZIP", ""))
-    force = _is_set(env.get("FORCE", ""))
-    quiet = _is_set(env.get("QUIET", ""))
-    quiet = True
-
-    if file_name is None:
-        api.dataset_download_files(
-            dataset, path=dest, unzip=unzip, force=force, quiet=quiet
+    file_pattern = env.get("FILE_PATTERN")
+    per_file = _is_set(env.get("PER_FILE", "")) or file_pattern is not None
+    file_pattern = file_pattern or "*"
+    workers = int(env.get("DOWNLOAD_WORKERS", 8))
+    downloader = _downloader(api, env)
+    ref = "datasets/%s/%s" % (owner_slug, dataset_slug)
+
+    if file_name is not None:
+        _, downloaded = _download_dataset_file(
+            api, downloader, owner_slug, dataset_slug, file_name, dest
         )
-    else:
-        api.dataset_download_file(
-            dataset, file_name, path=dest, force=force, quiet=quiet
+        output = dict(downloaded=downloaded, **_cache_output(downloader.cache))
+        _convert(env, dest, output)
+        output.update(_write_manifest(env, dest, ref))
+        return output
+
+    if per_file:
+        import fnmatch
+        from concurrent.futures import ThreadPoolExecutor
+
+        files = [
+            f.name
+            for f in api.dataset_list_files(dataset).files
+            if fnmatch.fnmatch(f.name, file_pattern)
+        ]
+
+        def download_file(name):
+            return _timed_dataset_file(
+                api, downloader, owner_slug, dataset_slug, name, dest, unzip
+            )
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            report = list(pool.map(download_file, files))
+        output = dict(
+            files=report,
+            bytes=sum(f["bytes"] for f in report),
+            **_cache_output(downloader.cache)
+        )
+        failed = [f["file"] for f in report if f["error"]]
+        if failed:
+            raise PartialError("failed to download %s" % ", ".join(failed), output)
+        _convert(env, dest, output)
+        output.update(_write_manifest(env, dest, ref))
+        return output
+
+    response = api.process_response(
+        api.datasets_download_with_http_info(
+            owner_slug=owner_slug, dataset_slug=dataset_slug, _preload_content=False
+        )
+    )
+    outfile = os.path.join(dest, dataset_slug + ".zip")
+    downloaded = downloader.fetch(response, outfile, ref)
+    if downloaded and unzip:
+        _unzip_in_place(outfile, dest)
+    output = dict(downloaded=downloaded, **_cache_output(downloader.cache))
+    _convert(env, dest, output)
+    output.update(_write_manifest(env, dest, ref))
+    return output
+
+
+def _unzip_in_place(outfile, dest):
+    import zipfile
+
+    from . import metrics
+
+    with metrics.phase("extract"), zipfile.ZipFile(outfile) as z:
+        z.extractall(dest)
+        metrics.add("bytes_extracted", sum(i.file_size for i in z.infolist()))
+    os.remove(outfile)
+
+
+def _download_dataset_file(api, downloader, owner_slug, dataset_slug, file_name, dest):
+    response = api.process_response(
+        api.datasets_download_file_with_http_info(
+            owner_slug=owner_slug,
+            dataset_slug=dataset_slug,
+            file_name=file_name,
+            _preload_content=False,
         )
-    return None
+    )
+    outfile = os.path.join(dest, _redirect_name(response))
+    ref = "datasets/%s/%s" % (owner_slug, dataset_slug)
+    downloaded = downloader.fetch(response, outfile, ref)
+    return outfile, downloaded
+
+
+def _timed_dataset_file(
+    api, downloader, owner_slug, dataset_slug, file_name, dest, unzip
+):
+    import zipfile
+
+    report = dict(file=file_name, bytes=0, seconds=0.0, downloaded=False, error="")
+    start = time.monotonic()
+    try:
+        outfile, downloaded = _download_dataset_file(
+            api, downloader, owner_slug, dataset_slug, file_name, dest
+        )
+        report.update(downloaded=downloaded, bytes=os.path.getsize(outfile))
+        if downloaded and unzip and zipfile.is_zipfile(outfile):
+            _unzip_in_place(outfile, dest)
+    except Exception:
+        report["error"] = traceback.format_exc()
+    report["seconds"] = time.monotonic() - start
+    return report
 
 
 @wrap_error
@@ -244,13 +644,15 @@ def create_dataset(api, env):
     convert_to_csv = _is_set(env.get("CONVERT_TO_CSV", ""))
     dir_mode = env.get("DIR_MODE")
 
-    return api.dataset_create_new(
+    uploader = _uploader(api, env)
+    result = uploader.api.dataset_create_new(
         folder=folder,
         public=public,
         quiet=quiet,
         convert_to_csv=convert_to_csv,
         dir_mode=dir_mode,
     )
+    return dict(result=result, uploads=uploader.report)
 
 
 @wrap_error
@@ -263,15 +665,113 @@ def dataset_version(api, env):
     convert_to_csv = _is_set(env.get("CONVERT_TO_CSV", ""))
     delete_old_versions = _is_set(env.get("DELETE_OLD_VERSIONS", ""))
     dir_mode = env.get("DIR_MODE")
+    delta = _is_set(env.get("DELTA", ""))
+
+    def create(uploader):
+        result = uploader.api.dataset_create_version(
+            folder,
+            version_notes,
+            quiet=quiet,
+            convert_to_csv=convert_to_csv,
+            delete_old_versions=delete_old_versions,
+            dir_mode=dir_mode,
+        )
+        return dict(result=result, uploads=uploader.report)
+
+    if delta:
+        return _delta_version(api, env, folder, dir_mode, create)
+    return create(_uploader(api, env))
+
 
-    return api.dataset_create_version(
+def _remote_version(api, ref):
+    owner_slug, dataset_slug = _split_ref(api, ref, api.validate_dataset_string)
+    view = api.process_response(
+        api.datasets_view_with_http_info(owner_slug, dataset_slug)
+    )
+    return view.get("currentVersionNumber")
+
+
+def _delta_version(api, env, folder, dir_mode, create):
+    from . import manifest
+
+    path = env.get("MANIFEST") or os.path.join(folder, manifest.DEFAULT_NAME)
+    previous = manifest.load(path) or dict()
+    with open(api.get_dataset_metadata_file(folder)) as f:
+        ref = json.load(f).get("id")
+    remote_version = _remote_version(api, ref)
+    if previous and (previous["dataset"], previous["version"]) != (
+        ref,
+        remote_version,
+    ):
+        # somebody else published a version, the manifest no longer
+        # describes what is online
+        raise PartialError(
+            "remote dataset %s is at version %s but the manifest describes %s "
+            "version %s"
+            % (ref, remote_version, previous["dataset"], previous["version"]),
+            dict(
+                manifest=path,
+                dataset=ref,
+                remote_version=remote_version,
+                manifest_version=previous["version"],
+            ),
+        )
+
+    rel = os.path.relpath(os.path.abspath(path), os.path.abspath(folder))
+    exclude = {rel, api.DATASET_METADATA_FILE, api.OLD_DATASET_METADATA_FILE}
+    files = manifest.scan(
         folder,
-        version_notes,
-        quiet=quiet,
-        convert_to_csv=convert_to_csv,
-        delete_old_versions=delete_old_versions,
-        dir_mode=dir_mode,
+        previous=previous.get("files"),
+        exclude=exclude,
+        workers=int(env.get("HASH_WORKERS", 8)),
+    )
+    changes = manifest.diff(previous.get("files", dict()), files)
+    # files are uploaded per top-level file or directory
+    touched = {
+        name.split("/")[0]
+        for key in ("added", "changed", "removed")
+        for name in changes[key]
+    }
+    reuse = dict()
+    if previous.get("dir_mode") == dir_mode:
+        reuse = {
+            name: token
+            for name, token in previous.get("tokens", dict()).items()
+            if name not in touched
+        }
+
+    # unchanged files are referenced by the tokens of their earlier upload.
+    # a version request only refers to uploaded blobs by token, but kaggle
+    # does not document for how long they stay valid, so a version rejected
+    # with reused tokens is created again with every file uploaded
+    uploader = _uploader(api, env, reuse=reuse, exclude=[rel])
+    output = create(uploader)
+    reuploaded = False
+    if reuse and _rejected(output["result"]):
+        uploader = _uploader(api, env, exclude=[rel])
+        output = create(uploader)
+        reuse, reuploaded = dict(), True
+    changes["unchanged"] = len(changes["unchanged"])
+    delta = dict(changes, reused=sorted(reuse), reuploaded=reuploaded)
+    if _rejected(output["result"]):
+        return dict(output, delta=delta)
+    manifest.save(
+        path,
+        dict(
+            dataset=ref,
+            # kaggle processes new versions asynchronously, the dataset may
+            # not report the new one yet
+            version=(remote_version or 0) + 1,
+            dir_mode=dir_mode,
+            files=files,
+            tokens=uploader.tokens,
+        ),
     )
+    return dict(output, delta=delta)
+
+
+def _rejected(result):
+    return getattr(result, "status", None) == "error"
 
 
 @wrap_error
@@ -304,7 +804,17 @@ def dataset_status(api, env):
     if dataset is None:
         raise ValueError("must specify dataset")
 
-    return api.dataset_status(dataset)
+    return _cached(
+        api, env, "dataset_status", lambda: api.dataset_status(dataset), dataset
+    )
+
+
+@wrap_error
+def wait_dataset(api, env):
+    datasets = _targets(api, env, "DATASET", "DATASETS", api.validate_dataset_string)
+    if not datasets:
+        raise ValueError("must specify dataset")
+    return _wait(env, "datasets", datasets, api.dataset_status)
 
 
 @wrap_error
@@ -325,20 +835,23 @@ def list_kernel(api, env):
     output_type = env.get("OUTPUT_TYPE")
     sort_by = env.get("SORT_BY")
 
-    return api.kernels_list(
-        page=page,
-        page_size=page_size,
-        search=search,
-        mine=mine,
-        dataset=dataset,
-        competition=competition,
-        parent_kernel=parent_kernel,
-        user=user,
-        language=language,
-        kernel_type=kernel_type,
-        output_type=output_type,
-        sort_by=sort_by,
-    )
+    def fetch(page):
+        return api.kernels_list(
+            page=page,
+            page_size=page_size,
+            search=search,
+            mine=mine,
+            dataset=dataset,
+            competition=competition,
+            parent_kernel=parent_kernel,
+            user=user,
+            language=language,
+            kernel_type=kernel_type,
+            output_type=output_type,
+            sort_by=sort_by,
+        )
+
+    return _paginate(env, fetch, page)
 
 
 @wrap_error
@@ -372,11 +885,41 @@ def kernel_output(api, env):
     if kernel is None:
         raise ValueError("must specify kernel")
     dest = env.get("DESTINATION")
-    force = _is_set(env.get("FORCE", ""))
-    quiet = _is_set(env.get("QUIET", ""))
-    quiet = True
+    downloader = _downloader(api, env)
 
-    return api.kernels_output(kernel, path=dest, force=force, quiet=quiet)
+    owner_slug, kernel_slug = _split_ref(api, kernel, api.validate_kernel_string)
+    if dest is None:
+        dest = api.get_default_download_dir(
+            "kernels", owner_slug, kernel_slug, "output"
+        )
+    os.makedirs(dest, exist_ok=True)
+    ref = "kernels/%s/%s" % (owner_slug, kernel_slug)
+
+    response = api.process_response(
+        api.kernel_output_with_http_info(owner_slug, kernel_slug)
+    )
+    outfiles = []
+    for item in response["files"]:
+        outfile = os.path.join(dest, item["fileName"])
+        outfiles.append(outfile)
+        file_response = downloader.pool.request(
+            "GET", item["url"], preload_content=False
+        )
+        if file_response.status != 200:
+            raise ValueError(
+                "failed to download %s (%d)" % (item["fileName"], file_response.status)
+            )
+        downloader.fetch(file_response, outfile, ref, url=item["url"])
+
+    log = response["log"]
+    if log:
+        outfile = os.path.join(dest, kernel_slug + ".log")
+        outfiles.append(outfile)
+        with open(outfile, "w") as f:
+            f.write(log)
+    output = dict(files=outfiles, **_cache_output(downloader.cache))
+    output.update(_write_manifest(env, dest, ref))
+    return output
 
 
 @wrap_error
@@ -384,12 +927,137 @@ def kernel_status(api, env):
     kernel = env.get("KERNEL")
     if kernel is None:
         raise ValueError("must specify kernel")
-    return api.kernels_status(kernel)
+    return _cached(
+        api, env, "kernel_status", lambda: api.kernels_status(kernel), kernel
+    )
+
+
+@wrap_error
+def wait_kernel(api, env):
+    kernels = _targets(api, env, "KERNEL", "KERNELS", api.validate_kernel_string)
+    if not kernels:
+        raise ValueError("must specify kernel")
+    return _wait(env, "kernels", kernels, lambda k: api.kernels_status(k)["status"])
 
 
+@offline
+@wrap_error
+def verify_manifest(api, env):
+    dest = env.get("DESTINATION")
+    if dest is None:
+        raise ValueError("must specify destination")
+    from . import manifest
+
+    report = manifest.verify(
+        dest,
+        workers=int(env.get("HASH_WORKERS", 8)),
+        quick=_is_set(env.get("QUICK", "")),
+    )
+    if not report["valid"]:
+        raise PartialError("%s does not match its manifest" % dest, report)
+    return report
+
+
+@offline
 @wrap_error
 def debug_auth(api, env):
     return dict(
         kaggle_username=env.get(KAGGLE_USERNAME, ""),
         kaggle_key=env.get(KAGGLE_KEY, ""),
     )
+
+
+def _load_operations(env):
+    import yaml
+
+    if env.get("BATCH") is not None:
+        operations = yaml.safe_load(env["BATCH"])
+    elif env.get("BATCH_FILE") is not None:
+        with open(env["BATCH_FILE"]) as f:
+            operations = yaml.safe_load(f)
+    else:
+        raise ValueError("must specify batch or batch file")
+    if not isinstance(operations, list):
+        raise ValueError("batch must be a list of operations")
+    return operations
+
+
+def _run_operation(api, env, operation):
+    command = operation.get("command")
+    subcommand = operation.get("subcommand")
+    result = dict(command=command, subcommand=subcommand)
+    func = FUNCTIONS.get(command, dict()).get(subcommand)
+    if func is None or command == "batch":
+        error = "unknown operation %s %s" % (command, subcommand)
+        return dict(result, success=False, error=error, output=None)
+
+    from .output import to_plain
+
+    # like real environment variables, every input is passed as a string
+    op_env = dict(env, **{k: str(v) for k, v in operation.get("env", {}).items()})
+    op_env.pop("BATCH", None)
+    op_env.pop("BATCH_FILE", None)
+    success, output, error = func(api, op_env)
+    return dict(result, success=success, error=error, output=to_plain(output))
+
+
+@wrap_error
+def run_batch(api, env):
+    operations = _load_operations(env)
+    workers = int(env.get("BATCH_WORKERS", 8))
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(lambda operation: _run_operation(api, env, operation), operations)
+        )
+    failed = [i for i, result in enumerate(results) if not result["success"]]
+    output = dict(
+        results=results, succeeded=len(results) - len(failed), failed=len(failed)
+    )
+    if failed:
+        raise PartialError("operations %s failed" % failed, output)
+    return output
+
+
+FUNCTIONS = {
+    "debug": {
+        "auth": debug_auth,
+    },
+    "competitions": {
+        "list": list_competitions,
+        "files": list_competition_files,
+        "download": download_competition,
+        "extract": extract_competition,
+        "submit": submit_competition,
+        "submissions": competition_submissions,
+        "leaderboard": competition_leaderboard,
+    },
+    "datasets": {
+        "list": list_dataset,
+        "files": list_dataset_files,
+        "download": download_dataset,
+        "create": create_dataset,
+        "version": dataset_version,
+        "init": init_dataset,
+        "metadata": dataset_metadata,
+        "status": dataset_status,
+        "wait": wait_dataset,
+    },
+    "kernels": {
+        "list": list_kernel,
+        "init": init_kernel,
+        "push": push_kernel,
+        "pull": pull_kernel,
+        "output": kernel_output,
+        "status": kernel_status,
+        "wait": wait_kernel,
+    },
+    "batch": {
+        "run": run_batch,
+    },
+    "manifest": {
+        "verify": verify_manifest,
+    },
+}
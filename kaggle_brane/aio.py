@@ -0,0 +1,105 @@
+"""
+asyncio counterparts of the kaggle_brane functions
+
+every function of kaggle_brane.FUNCTIONS is available here under the same
+name as a coroutine function with the same (api, env) arguments that
+returns the same (success, output, error). the sdk is blocking, so calls
+run on a thread pool, and a semaphore bounds how many of them are in
+flight at once (set_concurrency, default 64). list functions that page
+through all results (ALL_PAGES, MAX_ITEMS) return an async iterator.
+
+    api = await aio.authenticate(env)
+    results = await asyncio.gather(
+        *(aio.kernel_status(api, dict(KERNEL=k)) for k in kernels)
+    )
+"""
+
+import asyncio
+import functools
+import threading
+import types
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import kaggle_brane as kb
+
+DEFAULT_CONCURRENCY = 64
+
+_lock = threading.Lock()
+_state = dict(concurrency=DEFAULT_CONCURRENCY, executor=None)
+# asyncio primitives belong to the loop they are first used in
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_concurrency(concurrency):
+    """sets how many calls may be in flight at once"""
+    with _lock:
+        executor = _state["executor"]
+        _state.update(concurrency=concurrency, executor=None)
+        _semaphores.clear()
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _executor():
+    with _lock:
+        if _state["executor"] is None:
+            _state["executor"] = ThreadPoolExecutor(
+                max_workers=_state["concurrency"], thread_name_prefix="kaggle-brane"
+            )
+        return _state["executor"]
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if loop not in _semaphores:
+            _semaphores[loop] = asyncio.Semaphore(_state["concurrency"])
+        return _semaphores[loop]
+
+
+async def _run(f, *args):
+    async with _semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor(), functools.partial(f, *args))
+
+
+_DONE = object()
+
+
+async def _iterate(generator):
+    # every item is produced on the thread pool, so fetching a page does
+    # not block the loop
+    while True:
+        item = await _run(next, generator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+async def authenticate(env):
+    # size the connection pool for the calls in flight
+    env = dict(env)
+    env.setdefault("HTTP_POOL_SIZE", str(_state["concurrency"]))
+    return await _run(kb.authenticate, env)
+
+
+def _coroutine(func):
+    @functools.wraps(func)
+    async def call(api, env):
+        success, output, error = await _run(func, api, env)
+        if isinstance(output, types.GeneratorType):
+            output = _iterate(output)
+        return success, output, error
+
+    return call
+
+
+FUNCTIONS = {
+    command: {name: _coroutine(f) for name, f in subcommands.items()}
+    for command, subcommands in kb.FUNCTIONS.items()
+}
+
+for _subcommands in FUNCTIONS.values():
+    for _call in _subcommands.values():
+        globals()[_call.__name__] = _call
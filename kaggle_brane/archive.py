@@ -0,0 +1,406 @@
+"""
+streaming extraction of (nested) zip archives
+
+members are copied through ZipFile.open() in chunks of at most buffer_size
+bytes, so memory usage stays bounded regardless of the archive size.
+nested archives that are stored uncompressed are opened in place through a
+window on the outer file, compressed ones are spilled to a temporary file
+next to the destination because ZipFile needs to seek in them.
+
+top level members can be extracted by a pool of worker processes, each of
+them opening the outer archive on its own.
+
+with zero_copy, stored (uncompressed) members, including those of stored
+nested archives, are copied from the outer file into place by the kernel
+(copy_file_range, or sendfile) without passing through python buffers, and
+their crc is checked through a read-only mapping of the result.
+
+include and exclude globs select files by the path they are extracted to
+relative to dest, e.g. "train/*.csv" for the csv files of "train.zip".
+LazyArchive leaves the archive in place and extracts a file the first time
+its path is requested, looking it up in the central directories of the
+archive and of the nested archives on the way to it.
+"""
+
+import fnmatch
+import io
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import traceback
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from . import metrics
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+
+
+def _is_archive(name):
+    return name.lower().endswith(".zip")
+
+
+def _parts(name):
+    # like ZipFile._extract_member, drop anything that could escape dest
+    return [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+
+
+def _target(dest, name):
+    return os.path.join(dest, *_parts(name))
+
+
+def _data_offset(z, info):
+    z.fp.seek(info.header_offset)
+    header = z.fp.read(_LOCAL_HEADER.size)
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("bad local file header for %s" % info.filename)
+    name_length, extra_length = fields[-2:]
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+
+class _Window(io.RawIOBase):
+    """read-only, seekable view on a byte range of another file object"""
+
+    def __init__(self, fileobj, start, size):
+        self._file = fileobj
+        self._start = start
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise OSError("negative seek position %d" % offset)
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, b):
+        n = max(0, min(len(b), self._size - self._pos))
+        if n == 0:
+            return 0
+        self._file.seek(self._start + self._pos)
+        data = self._file.read(n)
+        b[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def _raw_location(z, info):
+    """the file descriptor and offset of the data of a stored member
+
+    None if the archive is not backed by a file, e.g. a spilled one.
+    """
+    offset = _data_offset(z, info)
+    fp = z.fp
+    while isinstance(fp, _Window):
+        offset += fp._start
+        fp = fp._file
+    try:
+        return fp.fileno(), offset
+    except (AttributeError, OSError):
+        return None
+
+
+def _kernel_copy(src, offset, count, dst):
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src, dst, count, offset)
+        except OSError:
+            # e.g. across file systems on older kernels
+            pass
+    return os.sendfile(dst, src, offset, count)
+
+
+def _copy_range(src, offset, size, dst):
+    copied = 0
+    try:
+        while copied < size:
+            n = _kernel_copy(src, offset + copied, min(size - copied, 1 << 30), dst)
+            if n == 0:
+                raise zipfile.BadZipFile("unexpected end of archive")
+            copied += n
+    except OSError:
+        # no file to file copies in the kernel, write from a mapping instead
+        with mmap.mmap(src, 0, access=mmap.ACCESS_READ) as m:
+            os.lseek(dst, copied, os.SEEK_SET)
+            view = memoryview(m)
+            try:
+                while copied < size:
+                    copied += os.write(dst, view[offset + copied : offset + size])
+            finally:
+                view.release()
+
+
+def _crc(path, size):
+    if size == 0:
+        return 0
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return zlib.crc32(m)
+
+
+def _extract_zero_copy(z, info, target):
+    """extracts a stored member without copying it, False if it cannot"""
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return False
+    location = _raw_location(z, info)
+    if location is None:
+        return False
+    src, offset = location
+    with open(target, "wb") as dst:
+        _copy_range(src, offset, info.file_size, dst.fileno())
+    if _crc(target, info.file_size) != info.CRC:
+        os.remove(target)
+        raise zipfile.BadZipFile("bad crc-32 for file %r" % info.filename)
+    return True
+
+
+@contextmanager
+def _open_archive(z, info, dest, buffer_size):
+    if info.compress_type == zipfile.ZIP_STORED:
+        window = _Window(z.fp, _data_offset(z, info), info.file_size)
+        with zipfile.ZipFile(window) as inner:
+            yield inner
+        return
+    with tempfile.TemporaryFile(dir=dest) as spill:
+        with z.open(info) as src:
+            shutil.copyfileobj(src, spill, buffer_size)
+        spill.seek(0)
+        with zipfile.ZipFile(spill) as inner:
+            yield inner
+
+
+class _Select:
+    """include and exclude globs on paths relative to root"""
+
+    def __init__(self, root, include=(), exclude=()):
+        self.root = root
+        self.include = list(include)
+        self.exclude = list(exclude)
+
+    def __call__(self, target):
+        rel = os.path.relpath(target, self.root).replace(os.sep, "/")
+        if self.include and not any(fnmatch.fnmatch(rel, p) for p in self.include):
+            return False
+        return not any(fnmatch.fnmatch(rel, p) for p in self.exclude)
+
+    def below(self, directory):
+        """whether any path below directory can be selected"""
+        prefix = os.path.relpath(directory, self.root).replace(os.sep, "/") + "/"
+        # "*" also matches "/", so "test/*" excludes everything below test
+        for p in self.exclude:
+            if p.endswith("*") and fnmatch.fnmatch(prefix, p[:-1]):
+                return False
+        if not self.include:
+            return True
+        for p in self.include:
+            # the part of the pattern before its first wildcard
+            literal = re.split(r"[*?\[]", p, maxsplit=1)[0]
+            if prefix.startswith(literal) or literal.startswith(prefix):
+                return True
+        return False
+
+
+def _write_member(z, info, target, buffer_size, zero_copy):
+    """writes a file member to target, returns whether it was zero-copy"""
+    if zero_copy and _extract_zero_copy(z, info, target):
+        return True
+    with z.open(info) as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, buffer_size)
+    return False
+
+
+def _extract_member(z, info, dest, buffer_size, stats, zero_copy=False, select=None):
+    if info.is_dir():
+        directory = _target(dest, info.filename)
+        if select is None or select.below(directory):
+            os.makedirs(directory, exist_ok=True)
+        return
+    if _is_archive(info.filename):
+        unarchived = _target(dest, os.path.splitext(info.filename)[0])
+        if select is None:
+            os.makedirs(unarchived, exist_ok=True)
+        elif not select.below(unarchived):
+            # without opening, let alone decompressing it
+            stats["skipped"] = stats.get("skipped", 0) + 1
+            return
+        with _open_archive(z, info, dest, buffer_size) as inner:
+            for inner_info in inner.infolist():
+                _extract_member(
+                    inner, inner_info, unarchived, buffer_size, stats, zero_copy, select
+                )
+        return
+    target = _target(dest, info.filename)
+    if select is not None and not select(target):
+        stats["skipped"] = stats.get("skipped", 0) + 1
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if _write_member(z, info, target, buffer_size, zero_copy):
+        stats["zero_copy"] = stats.get("zero_copy", 0) + 1
+    stats["files"] += 1
+    stats["bytes"] += info.file_size
+
+
+def _extract_top_level(filename, name, dest, buffer_size, zero_copy=False, select=None):
+    stats = dict(member=name, files=0, bytes=0, error="")
+    try:
+        with zipfile.ZipFile(filename) as z:
+            _extract_member(
+                z, z.getinfo(name), dest, buffer_size, stats, zero_copy, select
+            )
+    except Exception:
+        stats["error"] = traceback.format_exc()
+    return stats
+
+
+def extract(
+    filename,
+    dest,
+    buffer_size=DEFAULT_BUFFER_SIZE,
+    workers=1,
+    zero_copy=False,
+    include=(),
+    exclude=(),
+):
+    """recursively extracts filename into dest
+
+    every nested archive "name.zip" is extracted into a directory "name"
+    relative to the location it was found at. with include or exclude
+    globs, nested archives none of whose files can be selected are skipped
+    without being read and count as one skipped member. returns a report with one
+    entry per top level member in archive order, failing members carry
+    their traceback in "error" instead of aborting the extraction.
+    """
+    os.makedirs(dest, exist_ok=True)
+    select = _Select(dest, include, exclude) if include or exclude else None
+    with zipfile.ZipFile(filename) as z:
+        names = z.namelist()
+    with metrics.phase("extract"):
+        if workers > 1 and len(names) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(names))) as pool:
+                futures = [
+                    pool.submit(
+                        _extract_top_level,
+                        filename,
+                        name,
+                        dest,
+                        buffer_size,
+                        zero_copy,
+                        select,
+                    )
+                    for name in names
+                ]
+                members = [f.result() for f in futures]
+        else:
+            members = [
+                _extract_top_level(filename, name, dest, buffer_size, zero_copy, select)
+                for name in names
+            ]
+    report = dict(
+        files=sum(m["files"] for m in members),
+        bytes=sum(m["bytes"] for m in members),
+        members=members,
+    )
+    if zero_copy:
+        report.update(zero_copy=sum(m.get("zero_copy", 0) for m in members))
+    if select is not None:
+        report.update(skipped=sum(m.get("skipped", 0) for m in members))
+    metrics.add("bytes_extracted", report["bytes"])
+    return report
+
+
+def failed(report):
+    return [m for m in report["members"] if m["error"]]
+
+
+class LazyArchive:
+    """extracts files of an archive into dest when they are first requested
+
+    a file is requested by the path extract() would give it relative to
+    dest, e.g. "train/train.csv" for "train.csv" in the nested "train.zip".
+    a compressed nested archive is decompressed to a temporary file again
+    for every path() that is looked up in it, so files of those are best
+    requested at once with extract(include=...) instead.
+    """
+
+    def __init__(
+        self, filename, dest, buffer_size=DEFAULT_BUFFER_SIZE, zero_copy=False
+    ):
+        self.filename = filename
+        self.dest = dest
+        self.buffer_size = buffer_size
+        self.zero_copy = zero_copy
+        # reads nothing but the central directory
+        with zipfile.ZipFile(filename) as z:
+            self._infos = z.infolist()
+
+    def names(self):
+        """the top level files, nested archives are listed as directories"""
+        names = []
+        for info in self._infos:
+            if info.is_dir():
+                continue
+            name = "/".join(_parts(info.filename))
+            names.append(os.path.splitext(name)[0] + "/" if _is_archive(name) else name)
+        return names
+
+    def path(self, name):
+        """the path of the extracted file, extracting it first if needed"""
+        target = _target(self.dest, name)
+        if os.path.isfile(target):
+            return target
+        os.makedirs(self.dest, exist_ok=True)
+        with zipfile.ZipFile(self.filename) as z:
+            info = self._resolve(z, z.infolist(), _parts(name), target)
+        if info is None:
+            raise KeyError(name)
+        metrics.add("bytes_extracted", info.file_size)
+        return target
+
+    def _resolve(self, z, infos, parts, target):
+        files = dict()
+        archives = dict()
+        for info in infos:
+            name = "/".join(_parts(info.filename))
+            if _is_archive(name):
+                archives[os.path.splitext(name)[0]] = info
+            elif not info.is_dir():
+                files[name] = info
+        info = files.get("/".join(parts))
+        if info is not None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            part = target + ".part"
+            with metrics.phase("extract"):
+                _write_member(z, info, part, self.buffer_size, self.zero_copy)
+            os.replace(part, target)
+            return info
+        for i in range(len(parts) - 1, 0, -1):
+            nested = archives.get("/".join(parts[:i]))
+            if nested is None:
+                continue
+            with _open_archive(z, nested, self.dest, self.buffer_size) as inner:
+                info = self._resolve(inner, inner.infolist(), parts[i:], target)
+            if info is not None:
+                return info
+        return None
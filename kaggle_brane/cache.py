@@ -0,0 +1,145 @@
+"""
+content addressed on-disk cache for downloaded files
+
+entries are keyed by the reference (competition, dataset or kernel), the
+remote version (etag, or last modified date and size) and the file name.
+they are materialized into the destination by hard link, reflink or, as a
+last resort, by copying. when the total size exceeds max_size, the least
+recently used entries are evicted.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+
+# linux FICLONE ioctl, see ioctl_ficlone(2)
+_FICLONE = 0x40049409
+
+
+def version(headers):
+    """remote version of a download response, None if it cannot be cached"""
+    etag = headers.get("ETag")
+    if etag:
+        return etag.strip('"')
+    modified = headers.get("Last-Modified")
+    if modified:
+        return "%s:%s" % (modified, headers.get("Content-Length", ""))
+    return None
+
+
+def _reflink(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+
+def materialize(src, dst):
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        _reflink(src, dst)
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+class DownloadCache:
+    def __init__(self, root, max_size=None):
+        self.root = os.path.realpath(root)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(ref, remote_version, file_name):
+        h = hashlib.sha256()
+        for part in (ref, remote_version, file_name):
+            h.update(str(part).encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key, outfile):
+        entry = self.path(key)
+        try:
+            # bump the access time used for lru eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        materialize(entry, outfile)
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key, write):
+        """stores the file written by write(path) under key
+
+        one process at a time fills an entry. the others wait for it and
+        return the entry it stored, without calling write.
+        """
+        from .lock import FileLock
+
+        entry = self.path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        with FileLock(entry + ".lock") as lock:
+            if lock.waited and os.path.exists(entry):
+                return entry
+            with self._lock:
+                self.misses += 1
+            # a stable name lets an interrupted write resume from its leftovers
+            tmp = entry + ".tmp"
+            write(tmp)
+            os.replace(tmp, entry)
+        self.evict(keep=entry)
+        return entry
+
+    def entries(self):
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if "." in name:
+                    # partial writes, entries are plain hex digests
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self, keep=None):
+        if self.max_size is None:
+            return []
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted.append(path)
+        return evicted
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses)
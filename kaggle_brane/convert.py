@@ -0,0 +1,118 @@
+"""
+conversion of downloaded csv files into columnar formats
+
+every csv file below a destination is read in blocks by pyarrow's streaming
+csv reader and written to parquet (or feather, the arrow ipc file format)
+batch by batch, so memory is bounded by the block size rather than the size
+of the file. files are converted in parallel processes. pyarrow is an
+optional dependency that is only needed when converting.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import metrics
+
+FORMATS = ("parquet", "feather")
+DEFAULT_BLOCK_SIZE = 16 << 20
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError("converting to %s requires pyarrow" % " or ".join(FORMATS))
+
+
+def csv_files(dest):
+    for root, dirs, names in os.walk(dest):
+        dirs.sort()
+        for name in sorted(names):
+            if name.lower().endswith(".csv"):
+                yield os.path.join(root, name)
+
+
+def _writer(path, schema, fmt):
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if fmt == "parquet":
+        return pyarrow.parquet.ParquetWriter(path, schema)
+    return pyarrow.ipc.new_file(path, schema)
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns
+
+
+def _describe(path, fmt):
+    """rows and schema of a converted file, read from its metadata"""
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if fmt == "parquet":
+        f = pyarrow.parquet.ParquetFile(path)
+        return f.metadata.num_rows, f.schema_arrow
+    with pyarrow.memory_map(path) as source:
+        reader = pyarrow.ipc.open_file(source)
+        rows = sum(
+            reader.get_batch(i).num_rows for i in range(reader.num_record_batches)
+        )
+        return rows, reader.schema
+
+
+def convert_file(path, fmt="parquet", block_size=DEFAULT_BLOCK_SIZE, keep=True):
+    """converts one csv file, returns a report of the rows and schema"""
+    import pyarrow.csv
+
+    start = time.time()
+    target = os.path.splitext(path)[0] + "." + fmt
+    result = dict(file=path, output=target, rows=0, columns=dict(), error="")
+    try:
+        if os.path.exists(target) and _mtime(target) >= _mtime(path):
+            # converted by an earlier download
+            rows, schema = _describe(target, fmt)
+            result.update(rows=rows, skipped=True)
+            result["columns"] = {f.name: str(f.type) for f in schema}
+            return result
+        reader = pyarrow.csv.open_csv(
+            path, read_options=pyarrow.csv.ReadOptions(block_size=block_size)
+        )
+        result["columns"] = {f.name: str(f.type) for f in reader.schema}
+        part = target + ".part"
+        with _writer(part, reader.schema, fmt) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+                result["rows"] += batch.num_rows
+        os.replace(part, target)
+        if not keep:
+            os.remove(path)
+    except Exception as e:
+        result["error"] = str(e)
+        if os.path.exists(target + ".part"):
+            os.remove(target + ".part")
+    finally:
+        result["seconds"] = round(time.time() - start, 3)
+    return result
+
+
+def convert(dest, fmt="parquet", workers=1, block_size=DEFAULT_BLOCK_SIZE, keep=True):
+    """converts all csv files below dest, files are converted in parallel"""
+    if fmt not in FORMATS:
+        raise ValueError("can only convert to %s" % " or ".join(FORMATS))
+    _require_pyarrow()
+    files = list(csv_files(dest))
+    args = [(path, fmt, block_size, keep) for path in files]
+    with metrics.phase("convert"):
+        if workers > 1 and len(files) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(convert_file, *zip(*args)))
+        else:
+            results = [convert_file(*a) for a in args]
+    return dict(files=results, rows=sum(r["rows"] for r in results))
+
+
+def failed(report):
+    return [r for r in report["files"] if r["error"]]
@@ -0,0 +1,295 @@
+"""
+long-lived worker serving kaggle_brane functions over a unix socket
+
+the daemon authenticates once and keeps its KaggleApi (and with it the
+connection pool) alive, so a client only pays for the api round trip.
+requests and responses are single lines of json:
+
+    {"command": "kernels", "subcommand": "status", "env": {...}, "cwd": "..."}
+    {"success": true, "output": {...}, "error": "", "metrics": {...}}
+
+functions returning a generator are streamed as one {"item": ...} line per
+item before the final response line.
+
+requests are served concurrently. paths in the env of a request, and the
+paths that default to the working directory when unset, are resolved
+against the client's working directory before the call, which runs in the
+daemon's. the metrics of calls that overlap in time include each other's
+counters.
+
+the daemon authenticated with its own env, so it only serves clients with
+the same credentials and connection settings (API_HOST, RATE_*, HTTP_*,
+API_RETRIES, MAX_BACKOFF); others run their calls in-process.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+import traceback
+import types
+
+import kaggle_brane as kb
+from kaggle_brane import metrics
+from kaggle_brane.output import to_plain
+
+CONNECT_TIMEOUT = 5.0
+
+
+class Unavailable(Exception):
+    """the daemon cannot serve the request, run it in-process instead"""
+
+
+class RemoteError(Exception):
+    """a streamed function failed in the daemon"""
+
+
+def default_socket_path():
+    # a directory only the user can enter, so nobody else can take the path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "kaggle-brane.sock")
+    directory = os.path.join(tempfile.gettempdir(), "kaggle-brane-%d" % os.getuid())
+    return os.path.join(directory, "daemon.sock")
+
+
+def _private_directory(path):
+    """creates the directory of path readable only by the user, if missing"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError("%s is not private to the user" % directory)
+
+
+def _owned(path):
+    """raises Unavailable unless path is a socket of the user"""
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        raise Unavailable("no daemon listening on %s" % path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise Unavailable("%s is not a socket of the user" % path)
+
+
+def _check_peer(s):
+    """raises Unavailable unless the process listening on s is the user's"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return
+    credentials = s.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", credentials)
+    if uid != os.getuid():
+        raise Unavailable("the daemon runs as another user")
+
+
+def socket_path(env):
+    return env.get("KAGGLE_BRANE_SOCKET") or default_socket_path()
+
+
+# inputs naming local files or directories
+PATHS = ("DESTINATION", "FOLDER", "CACHE_DIR", "MANIFEST", "BATCH_FILE")
+_SUBMIT = ("competitions", "submit")
+_SETTINGS = ("API_HOST", "RATE_LIMIT", "RATE_BURST", "API_RETRIES", "MAX_BACKOFF")
+
+
+def _credentials(env):
+    return env.get(kb.KAGGLE_USERNAME, ""), env.get(kb.KAGGLE_KEY, "")
+
+
+def _settings(env):
+    """the settings authenticate applied to the api"""
+    return {
+        name: value
+        for name, value in env.items()
+        if name in _SETTINGS or name.startswith("HTTP_")
+    }
+
+
+def _resolve_paths(env, cwd, command, subcommand):
+    env = dict(env)
+    names = PATHS + (("FILE_NAME",) if (command, subcommand) == _SUBMIT else ())
+    for name in names:
+        if env.get(name):
+            env[name] = os.path.join(cwd, env[name])
+    return env
+
+
+def _resolve(api, request):
+    """the env of request with its paths made independent of the working
+    directory"""
+    cwd = request.get("cwd") or os.getcwd()
+    command, subcommand = request["command"], request["subcommand"]
+    env = _resolve_paths(request["env"], cwd, command, subcommand)
+    if command == "batch":
+        operations = kb._load_operations(env)
+        for operation in operations:
+            operation["env"] = _resolve_paths(
+                operation.get("env") or {},
+                cwd,
+                operation.get("command"),
+                operation.get("subcommand"),
+            )
+        env.pop("BATCH_FILE", None)
+        env["BATCH"] = json.dumps(operations)
+    # the defaults of unset paths, see the sdk's get_default_download_dir
+    env.setdefault("FOLDER", cwd)
+    if command in ("competitions", "batch") or (
+        api.get_config_value(api.CONFIG_NAME_PATH) is None
+    ):
+        env["DESTINATION"] = env.get("DESTINATION") or cwd
+    return env
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def write(self, message):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = self.server.execute(request, self.write)
+        except Exception:
+            response = dict(success=False, output=None, error=traceback.format_exc())
+        self.write(response)
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, env):
+        self.api = kb.authenticate(env)
+        self.credentials = _credentials(env)
+        self.settings = _settings(env)
+        if path == default_socket_path():
+            _private_directory(path)
+        if os.path.lexists(path):
+            if _listening(path):
+                raise RuntimeError("a daemon is already serving on %s" % path)
+            # left behind by a daemon that did not shut down cleanly
+            os.remove(path)
+        # the socket is created accessible to the user only
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def execute(self, request, write):
+        if request.get("op") == "shutdown":
+            threading.Thread(target=self.shutdown).start()
+            return dict(success=True, output=None, error="")
+        if _credentials(request["env"]) != self.credentials:
+            return dict(unavailable="daemon serves different credentials")
+        if _settings(request["env"]) != self.settings:
+            return dict(unavailable="daemon serves different connection settings")
+        func = kb.FUNCTIONS[request["command"]][request["subcommand"]]
+        env = _resolve(self.api, request)
+        start = metrics.snapshot()
+        success, output, error = func(self.api, env)
+        if isinstance(output, types.GeneratorType):
+            for item in output:
+                write(dict(item=to_plain(item)))
+            output = None
+        with metrics.phase("serialize"):
+            output = to_plain(output)
+        measured = metrics.since(start)
+        return dict(success=success, output=output, error=error, metrics=measured)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(env):
+    server = Server(socket_path(env), env)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _listening(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CONNECT_TIMEOUT)
+        try:
+            s.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def _send(path, request):
+    # the request carries the credentials, it is only sent to a daemon of
+    # the same user
+    _owned(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(CONNECT_TIMEOUT)
+        try:
+            s.connect(path)
+        except OSError as e:
+            raise Unavailable(str(e))
+        _check_peer(s)
+        # once sent, the request may already be running in the daemon and
+        # must not be repeated in-process, so errors past this point are final
+        s.settimeout(None)
+        s.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        f = s.makefile("rb")
+        response = _receive(f)
+        if "item" in response:
+            # the connection stays open until _items has read the stream, the
+            # metrics are only known once it has
+            measured = dict()
+            output = _items(f, response, measured)
+            return dict(success=True, output=output, error="", metrics=measured)
+        f.close()
+    if "unavailable" in response:
+        raise Unavailable(response["unavailable"])
+    return response
+
+
+def _receive(f):
+    line = f.readline()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def _items(f, response, measured):
+    try:
+        while "item" in response:
+            yield response["item"]
+            response = _receive(f)
+    finally:
+        f.close()
+    measured.update(response.get("metrics") or {})
+    if not response["success"]:
+        raise RemoteError(response["error"])
+
+
+def call(command, subcommand, env):
+    """runs a function in the daemon, raises Unavailable if it cannot
+
+    returns success, output, error and the metrics of the call, which
+    include the counters of the api requests made
+    """
+    request = dict(
+        command=command, subcommand=subcommand, env=dict(env), cwd=os.getcwd()
+    )
+    response = _send(socket_path(env), request)
+    return (
+        response["success"],
+        response["output"],
+        response["error"],
+        response.get("metrics"),
+    )
+
+
+def stop(env):
+    _send(socket_path(env), dict(op="shutdown"))
@@ -0,0 +1,275 @@
+"""
+resumable downloads
+
+the body of a response is written to "<outfile>.part", which is only renamed
+to outfile after its size (and md5, if the storage backend sent one) has
+been verified. when a download is interrupted, the remainder is fetched with
+a http range request against the storage url kaggle redirected to, so an
+existing .part file is resumed instead of restarted. large files can be
+split into byte range segments that are fetched in parallel.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+from . import cache, metrics
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_SEGMENT_SIZE = 64 << 20
+
+_TRANSIENT = (urllib3.exceptions.HTTPError, OSError)
+
+
+class DownloadError(IOError):
+    pass
+
+
+class IntegrityError(DownloadError):
+    pass
+
+
+def _redirect_url(response):
+    history = response.retries.history if response.retries else ()
+    if history and history[-1].redirect_location:
+        return history[-1].redirect_location
+    return None
+
+
+def _expected_md5(headers):
+    # google cloud storage sends e.g. "x-goog-hash: crc32c=...,md5=..."
+    for value in headers.get("x-goog-hash", "").split(","):
+        algorithm, _, digest = value.strip().partition("=")
+        if algorithm == "md5":
+            return base64.b64decode(digest).hex()
+    return None
+
+
+def _range(pool, url, start, end=""):
+    headers = {"Range": "bytes=%d-%s" % (start, end)}
+    return pool.request("GET", url, headers=headers, preload_content=False)
+
+
+def _check_range(response):
+    if response.status == 206:
+        return
+    message = "range request failed with status %d" % response.status
+    if response.status == 429 or response.status >= 500:
+        raise urllib3.exceptions.ProtocolError(message)
+    # e.g. 403 once the signed url expired, or 416
+    raise DownloadError(message)
+
+
+def _backoff(attempt):
+    time.sleep(min(1 << attempt, 30))
+
+
+def _download_sequential(pool, response, url, part, size, chunk_size, retries):
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if os.path.exists(part + ".segments"):
+        # left by an interrupted segmented download, the part is pre-sized
+        # and holes do not tell how much of it was written
+        os.remove(part + ".segments")
+        offset = 0
+    if offset == size:
+        response.close()
+        return
+    if offset > size or url is None:
+        offset = 0
+    attempt = 0
+    while True:
+        try:
+            if offset > 0 or attempt > 0:
+                # the body of a failed response cannot be read again
+                response.close()
+                response = _range(pool, url, offset)
+                if response.status == 200:
+                    # the server ignored the range
+                    offset = 0
+                else:
+                    _check_range(response)
+            with open(part, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                while True:
+                    data = response.read(chunk_size)
+                    if not data:
+                        break
+                    f.write(data)
+                    metrics.add("bytes_downloaded", len(data))
+            if os.path.getsize(part) < size:
+                raise urllib3.exceptions.ProtocolError(
+                    "connection closed before the download finished"
+                )
+            return
+        except DownloadError:
+            raise
+        except _TRANSIENT:
+            attempt += 1
+            if attempt > retries or url is None:
+                raise
+            _backoff(attempt)
+            offset = os.path.getsize(part)
+
+
+def _download_segments(
+    pool, url, part, size, workers, segment_size, chunk_size, retries
+):
+    state_file = part + ".segments"
+    done = set()
+    if os.path.exists(state_file) and os.path.exists(part):
+        if os.path.getsize(part) == size:
+            with open(state_file) as f:
+                done = set(json.load(f))
+    if not done:
+        with open(part, "wb") as f:
+            f.truncate(size)
+
+    segments = [
+        (i, start, min(start + segment_size, size) - 1)
+        for i, start in enumerate(range(0, size, segment_size))
+    ]
+    lock = threading.Lock()
+    fd = os.open(part, os.O_WRONLY)
+
+    def fetch(segment):
+        i, start, end = segment
+        attempt = 0
+        while True:
+            try:
+                response = _range(pool, url, start, end)
+                _check_range(response)
+                offset = start
+                while True:
+                    data = response.read(chunk_size)
+                    if not data:
+                        break
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+                    metrics.add("bytes_downloaded", len(data))
+                if offset != end + 1:
+                    raise urllib3.exceptions.ProtocolError(
+                        "short read for bytes %d-%d" % (start, end)
+                    )
+                break
+            except DownloadError:
+                raise
+            except _TRANSIENT:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                _backoff(attempt)
+        with lock:
+            done.add(i)
+            with open(state_file + ".tmp", "w") as f:
+                json.dump(sorted(done), f)
+            os.replace(state_file + ".tmp", state_file)
+
+    try:
+        missing = [s for s in segments if s[0] not in done]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch, missing))
+    finally:
+        os.close(fd)
+    os.remove(state_file)
+
+
+def _md5(path, chunk_size):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk_size), b""):
+            h.update(data)
+    return h.hexdigest()
+
+
+def verify(path, size, md5=None, verify_zip=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    actual = os.path.getsize(path)
+    if actual != size:
+        raise IntegrityError("expected %d bytes but got %d" % (size, actual))
+    if md5 is not None and _md5(path, chunk_size) != md5:
+        raise IntegrityError("md5 mismatch, expected %s" % md5)
+    if verify_zip and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            bad = z.testzip()
+        if bad is not None:
+            raise IntegrityError("crc mismatch for member %s" % bad)
+
+
+def download(
+    pool,
+    response,
+    outfile,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    segments=1,
+    segment_size=DEFAULT_SEGMENT_SIZE,
+    retries=3,
+    verify_zip=False,
+    url=None,
+):
+    """downloads the body of response to outfile through outfile.part
+
+    url is where range requests for resuming are sent to, it defaults to
+    the location the request for response was redirected to.
+    """
+    size = int(response.headers["Content-Length"])
+    url = url or _redirect_url(response)
+    md5 = _expected_md5(response.headers)
+    part = outfile + ".part"
+    os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+    with metrics.phase("download"):
+        if url is not None and segments > 1 and size > segment_size:
+            response.close()
+            _download_segments(
+                pool, url, part, size, segments, segment_size, chunk_size, retries
+            )
+        else:
+            _download_sequential(pool, response, url, part, size, chunk_size, retries)
+    try:
+        verify(part, size, md5=md5, verify_zip=verify_zip, chunk_size=chunk_size)
+    except IntegrityError:
+        os.remove(part)
+        raise
+    os.replace(part, outfile)
+
+
+class Downloader:
+    """fetches api download responses, optionally through a DownloadCache"""
+
+    def __init__(self, api, download_cache=None, force=False, **options):
+        self.api = api
+        self.cache = download_cache
+        self.force = force
+        self.options = options
+
+    @property
+    def pool(self):
+        return self.api.api_client.rest_client.pool_manager
+
+    def _write(self, response, path, url):
+        download(self.pool, response, path, url=url, **self.options)
+
+    def fetch(self, response, outfile, ref, url=None):
+        """returns whether outfile was (re)written"""
+        if not self.force and not self.api.download_needed(response, outfile):
+            response.close()
+            return False
+        remote_version = cache.version(response.headers)
+        if self.cache is None or remote_version is None:
+            self._write(response, outfile, url)
+            return True
+        key = self.cache.key(ref, remote_version, os.path.basename(outfile))
+        if not self.force and self.cache.get(key, outfile):
+            response.close()
+            return True
+        entry = self.cache.put(key, lambda path: self._write(response, path, url))
+        # unread if another process filled the entry in the meantime
+        response.close()
+        cache.materialize(entry, outfile)
+        return True
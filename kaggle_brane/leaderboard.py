@@ -0,0 +1,136 @@
+"""
+compact in-memory leaderboards
+
+the leaderboard csv (TeamId, TeamName, SubmissionDate, Score) is parsed row
+by row into flat arrays instead of one python object per team: team ids and
+scores in typed arrays and all team names in a single utf-8 buffer indexed
+by offsets. ranks follow the standard competition ranking, teams with equal
+scores share a rank.
+"""
+
+import bisect
+import csv
+import io
+import math
+import zipfile
+from array import array
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Leaderboard:
+    def __init__(self, descending=True):
+        """descending is whether higher scores rank better"""
+        self.descending = descending
+        self.team_ids = array("q")
+        self.scores = array("d")
+        self._names = bytearray()
+        self._offsets = array("q", [0])
+        self._ranked = None
+        self._sorted_scores = None
+
+    def __len__(self):
+        return len(self.team_ids)
+
+    def name(self, i):
+        return self._names[self._offsets[i] : self._offsets[i + 1]].decode("utf-8")
+
+    def _load_rows(self, rows):
+        index = dict()
+        for row in rows:
+            team_id = int(row["TeamId"])
+            score = _score(row.get("Score"))
+            if team_id in index:
+                # a later row of the same team supersedes the earlier one
+                self.scores[index[team_id]] = score
+                continue
+            index[team_id] = len(self.team_ids)
+            self.team_ids.append(team_id)
+            self.scores.append(score)
+            self._names += row.get("TeamName", "").encode("utf-8")
+            self._offsets.append(len(self._names))
+
+    @classmethod
+    def from_csv(cls, f, descending=True):
+        """parses a leaderboard csv from a text file object"""
+        board = cls(descending)
+        board._load_rows(csv.DictReader(f))
+        return board
+
+    @classmethod
+    def load(cls, path, descending=True):
+        """parses a leaderboard from a csv file or a zip archive holding one"""
+        if not zipfile.is_zipfile(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                return cls.from_csv(f, descending)
+        with zipfile.ZipFile(path) as z:
+            member = next(n for n in z.namelist() if n.lower().endswith(".csv"))
+            with z.open(member) as raw:
+                f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                return cls.from_csv(f, descending)
+
+    def _rank_index(self):
+        if self._ranked is None:
+            scored = [i for i, s in enumerate(self.scores) if not math.isnan(s)]
+            scored.sort(key=self.scores.__getitem__, reverse=self.descending)
+            self._ranked = array("q", scored)
+            self._sorted_scores = array("d", sorted(self.scores[i] for i in scored))
+        return self._ranked
+
+    def _rank_of_score(self, score):
+        self._rank_index()
+        if self.descending:
+            better = len(self._sorted_scores) - bisect.bisect_right(
+                self._sorted_scores, score
+            )
+        else:
+            better = bisect.bisect_left(self._sorted_scores, score)
+        return better + 1
+
+    def _entry(self, i):
+        score = self.scores[i]
+        return dict(
+            rank=None if math.isnan(score) else self._rank_of_score(score),
+            team_id=self.team_ids[i],
+            team_name=self.name(i),
+            score=None if math.isnan(score) else score,
+        )
+
+    def top(self, n=10):
+        return [self._entry(i) for i in self._rank_index()[:n]]
+
+    def rank(self, team):
+        """the entry of a team given by id or name, None if it is not listed"""
+        team = str(team)
+        for i in range(len(self)):
+            if str(self.team_ids[i]) == team or self.name(i) == team:
+                return self._entry(i)
+        return None
+
+    def histogram(self, bins=10):
+        """counts of the scores in bins of equal width"""
+        self._rank_index()
+        scores = self._sorted_scores
+        if not scores:
+            return dict(edges=[], counts=[])
+        low, high = scores[0], scores[-1]
+        if low == high:
+            # a single bin holds them all
+            return dict(edges=[low, high], counts=[len(scores)])
+        width = (high - low) / bins
+        edges = [low + width * b for b in range(bins)] + [high]
+        counts = []
+        for b in range(bins):
+            # the last bin includes its upper edge
+            end = (
+                bisect.bisect_left(scores, edges[b + 1])
+                if b < bins - 1
+                else len(scores)
+            )
+            counts.append(end - sum(counts))
+        return dict(edges=edges, counts=counts)
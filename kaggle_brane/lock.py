@@ -0,0 +1,232 @@
+"""
+lock files coordinating processes that download to the same destination
+
+a lock is a file created atomically next to what it guards, recording its
+owner. while it is held, a heartbeat thread refreshes its mtime. a lock is
+stale when its heartbeat stopped for longer than the stale timeout, or when
+its owner is a process on this host that no longer exists; stale locks are
+broken by the next process that waits for them.
+
+single_flight runs a piece of work under a lock. processes that had to wait
+for the lock reuse the result the holder recorded when it finished, instead
+of doing the same work again.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from . import metrics
+
+DEFAULT_STALE = 60.0
+DEFAULT_POLL = 0.2
+DIRECTORY = ".kaggle-brane"
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class FileLock:
+    def __init__(self, path, stale=DEFAULT_STALE, timeout=None, poll=DEFAULT_POLL):
+        self.path = path
+        self.stale = stale
+        self.timeout = timeout
+        self.poll = poll
+        self.broken = 0
+        self.waited = 0.0
+        self.token = None
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _create(self):
+        token = uuid.uuid4().hex
+        owner = dict(
+            token=token, pid=os.getpid(), host=socket.gethostname(), since=time.time()
+        )
+        tmp = "%s.%s.tmp" % (self.path, token)
+        while True:
+            # the directory may be removed by single_flight in the meantime
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(owner, f)
+                break
+            except FileNotFoundError:
+                pass
+        try:
+            # link fails if the lock exists, so it appears with its content
+            os.link(tmp, self.path)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+        self.token = token
+        return True
+
+    def _is_stale(self, owner):
+        try:
+            age = time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if age > self.stale:
+            return True
+        if owner is None or owner.get("host") != socket.gethostname():
+            return False
+        return not _alive(owner["pid"])
+
+    def _break_if_stale(self):
+        owner = _read(self.path)
+        if not self._is_stale(owner):
+            return False
+        moved = "%s.stale.%s" % (self.path, uuid.uuid4().hex)
+        try:
+            os.rename(self.path, moved)
+        except FileNotFoundError:
+            # released or broken by someone else in the meantime
+            return True
+        if (_read(moved) or {}).get("token") != (owner or {}).get("token"):
+            # a new holder replaced the stale lock before it was moved
+            try:
+                os.link(moved, self.path)
+            except FileExistsError:
+                pass
+            os.remove(moved)
+            return False
+        os.remove(moved)
+        self.broken += 1
+        return True
+
+    def _beat(self):
+        while not self._stop.wait(self.stale / 4):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def acquire(self):
+        """waits for the lock, returns the seconds spent waiting or 0 if it
+        was free"""
+        start = time.monotonic()
+        contended = False
+        while not self._create():
+            contended = True
+            if self._break_if_stale():
+                continue
+            waited = time.monotonic() - start
+            if self.timeout is not None and waited > self.timeout:
+                raise LockTimeout("gave up waiting for %s" % self.path)
+            time.sleep(self.poll)
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+        self.waited = time.monotonic() - start if contended else 0.0
+        return self.waited
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        # the lock may have been broken as stale and taken by another process
+        if (_read(self.path) or {}).get("token") == self.token:
+            os.remove(self.path)
+        self.token = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _waiting(path):
+    folder, name = os.path.split(path)
+    prefix = name + ".waiting."
+    try:
+        return [n for n in os.listdir(folder) if n.startswith(prefix)]
+    except FileNotFoundError:
+        return []
+
+
+def _register(path, token):
+    # the lock directory is removed by the last process that leaves it
+    while True:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open("%s.waiting.%s" % (path, token), "w"):
+                return
+        except FileNotFoundError:
+            pass
+
+
+def single_flight(
+    path, work, key=None, stale=DEFAULT_STALE, timeout=None, poll=DEFAULT_POLL
+):
+    """runs work() under the lock path.lock unless a process that held it
+    when this one started waiting finished the same work (with the same key)
+
+    returns the output and a report of the coordination. the output of work
+    must be json serializable, it is recorded in path.done for the processes
+    waiting for the lock. the last of them removes it, and the directory of
+    path if that is empty then.
+    """
+    lock = FileLock(path + ".lock", stale=stale, timeout=timeout, poll=poll)
+    token = uuid.uuid4().hex
+    started = time.time()
+    _register(path, token)
+    try:
+        with metrics.phase("lock"):
+            waited = lock.acquire()
+    finally:
+        os.remove("%s.waiting.%s" % (path, token))
+    report = dict(waited=round(waited, 3), reused=False)
+    try:
+        done = _read(path + ".done")
+        if (
+            waited > 0
+            and done is not None
+            and done["key"] == key
+            and done["finished"] >= started
+        ):
+            output = done["output"]
+            report.update(reused=True)
+        else:
+            if done is not None:
+                os.remove(path + ".done")
+            output = work()
+            with open(path + ".done.tmp", "w") as f:
+                json.dump(dict(key=key, finished=time.time(), output=output), f)
+            os.replace(path + ".done.tmp", path + ".done")
+        if not _waiting(path):
+            # processes arriving from now on started after it finished
+            os.remove(path + ".done")
+    finally:
+        lock.release()
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+    report.update(stale_locks=lock.broken)
+    return output, report
@@ -0,0 +1,142 @@
+"""
+manifests recording the size, mtime and hash of every file below a folder
+
+a manifest is a json file with a "files" object that maps every file to
+{"size": ..., "mtime": ..., "sha256": ...}, next to what it describes: the
+source of a download, or the dataset and version a folder was published as.
+
+files are hashed in parallel, large ones through mmap so that the hashing
+(which releases the gil) does not copy them through python buffers. when
+scanning against a previous manifest, the hash of a file whose size and
+mtime did not change is taken over without reading the file again.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import lock, metrics
+
+DEFAULT_NAME = ".kaggle-brane-manifest.json"
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+
+def file_hash(path, buffer_size=DEFAULT_BUFFER_SIZE):
+    h = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        if os.fstat(f.fileno()).st_size >= buffer_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+            return h.hexdigest()
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+def _walk(folder, exclude):
+    for root, dirs, names in os.walk(folder):
+        if root == folder:
+            # lock files of downloads to folder
+            dirs[:] = [d for d in dirs if d != lock.DIRECTORY]
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, folder).replace(os.sep, "/")
+            if rel not in exclude:
+                yield rel, path
+
+
+def scan(folder, previous=None, exclude=(), workers=8, buffer_size=None):
+    """returns the manifest entries of all files below folder"""
+    previous = previous or dict()
+    buffer_size = buffer_size or DEFAULT_BUFFER_SIZE
+
+    def entry(item):
+        rel, path = item
+        stat = os.stat(path)
+        old = previous.get(rel)
+        if old and (old["size"], old["mtime"]) == (stat.st_size, stat.st_mtime_ns):
+            digest = old["sha256"]
+        else:
+            digest = file_hash(path, buffer_size)
+        return rel, dict(size=stat.st_size, mtime=stat.st_mtime_ns, sha256=digest)
+
+    with metrics.phase("hash"), ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(entry, _walk(folder, set(exclude))))
+
+
+def diff(old, new):
+    """compares two sets of manifest entries by their size and hash"""
+
+    def same(rel):
+        return (old[rel]["size"], old[rel]["sha256"]) == (
+            new[rel]["size"],
+            new[rel]["sha256"],
+        )
+
+    return dict(
+        added=sorted(set(new) - set(old)),
+        removed=sorted(set(old) - set(new)),
+        changed=sorted(rel for rel in set(old) & set(new) if not same(rel)),
+        unchanged=sorted(rel for rel in set(old) & set(new) if same(rel)),
+    )
+
+
+def load(path):
+    """returns the manifest at path, None if there is none"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save(path, manifest):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def write(folder, source, workers=8, buffer_size=None):
+    """records all files below folder, returns the path of the manifest"""
+    path = os.path.join(folder, DEFAULT_NAME)
+    files = scan(
+        folder, exclude=[DEFAULT_NAME], workers=workers, buffer_size=buffer_size
+    )
+    save(path, dict(source=source, files=files))
+    return path
+
+
+def verify(folder, workers=8, buffer_size=None, quick=False):
+    """checks the files below folder against its manifest
+
+    with quick, files are only compared by size and mtime.
+    """
+    manifest = load(os.path.join(folder, DEFAULT_NAME))
+    if manifest is None:
+        raise ValueError("no manifest in %s" % folder)
+    expected = manifest["files"]
+    previous = expected if quick else None
+    actual = scan(
+        folder,
+        previous=previous,
+        exclude=[DEFAULT_NAME],
+        workers=workers,
+        buffer_size=buffer_size,
+    )
+    changes = diff(expected, actual)
+    return dict(
+        source=manifest.get("source"),
+        valid=not (changes["removed"] or changes["changed"]),
+        missing=changes["removed"],
+        changed=changes["changed"],
+        extra=changes["added"],
+        verified=len(changes["unchanged"]),
+    )
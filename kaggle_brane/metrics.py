@@ -0,0 +1,153 @@
+"""
+timings and counters of the function calls of a process
+
+phases (auth, api, download, extract, ...) are measured in wall time: a
+phase that runs in several threads at once counts the time during which at
+least one of them was in it, so phases can overlap but never add up to more
+than the duration of the call. counters (bytes_downloaded, ...) and phases
+accumulate for the whole process, report() returns what changed since the
+outermost call began.
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_counters = dict()
+_phases = dict()
+# phase -> [threads in the phase, when the first of them entered it]
+_active = dict()
+_call = dict(depth=0)
+
+
+def add(name, value):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def phase(name):
+    with _lock:
+        state = _active.setdefault(name, [0, 0.0])
+        if state[0] == 0:
+            state[1] = time.perf_counter()
+        state[0] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            state[0] -= 1
+            if state[0] == 0:
+                elapsed = time.perf_counter() - state[1]
+                _phases[name] = _phases.get(name, 0.0) + elapsed
+
+
+def peak_rss():
+    """the peak resident set size of the process in bytes, None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _requests():
+    # only processes that talk to the api have loaded the scheduler
+    scheduler = sys.modules.get("kaggle_brane.scheduler")
+    return scheduler.totals() if scheduler is not None else None
+
+
+def snapshot():
+    """the state since() measures from"""
+    return dict(
+        time=time.perf_counter(),
+        counters=dict(_counters),
+        phases=dict(_phases),
+        requests=_requests(),
+    )
+
+
+def begin():
+    """starts a call, calls nested in it are measured as part of it"""
+    with _lock:
+        _call["depth"] += 1
+        if _call["depth"] == 1:
+            _call.update(start=snapshot(), end=None, profile=None)
+            return True
+    return False
+
+
+def end():
+    with _lock:
+        _call["depth"] -= 1
+        if _call["depth"] == 0:
+            _call["end"] = snapshot()
+
+
+def _delta(start, end):
+    return {k: round(v - start.get(k, 0), 3) for k, v in end.items()}
+
+
+def _measure(start, end):
+    result = dict(
+        seconds=round(end["time"] - start["time"], 3),
+        phases=_delta(start["phases"], end["phases"]),
+        peak_rss=peak_rss(),
+    )
+    result.update(_delta(start["counters"], end["counters"]))
+    if end["requests"] is not None:
+        result.update(requests=_delta(start["requests"] or {}, end["requests"]))
+    return result
+
+
+def since(start):
+    """the metrics of everything in the process since the snapshot start"""
+    return _measure(start, snapshot())
+
+
+def report():
+    """the metrics of the last outermost call"""
+    with _lock:
+        start = _call.get("start")
+        end = _call.get("end") or snapshot()
+    if start is None:
+        return None
+    result = _measure(start, end)
+    if _call.get("profile"):
+        result.update(profile=_call["profile"])
+    return result
+
+
+@contextmanager
+def profile(path):
+    """writes a cProfile of the calling thread to path as pstats"""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+@contextmanager
+def call(env):
+    """measures a function call, profiling it if env has PROFILE set"""
+    outermost = begin()
+    path = env.get("PROFILE") if outermost and hasattr(env, "get") else None
+    try:
+        if path:
+            _call["profile"] = os.path.abspath(path)
+            with profile(path):
+                yield
+        else:
+            yield
+    finally:
+        end()
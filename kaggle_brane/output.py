@@ -0,0 +1,117 @@
+"""
+conversion of api results into plain structures for yaml and json output
+
+to_plain looks up a converter by the exact type of every value. converters
+are built once per type: the sdk's swagger models are read through a field
+map precomputed from their swagger_types instead of going through to_dict,
+other objects through their __dict__. yaml is written with libyaml's
+CSafeDumper when pyyaml was built with it.
+"""
+
+import datetime
+import json
+import traceback
+import types
+
+_CONVERTERS = dict()
+# str() of a str subclass such as a str enum is not its value
+_BUILTINS = ((bool, bool), (int, int), (float, float), (str, str.__str__))
+
+
+def _identity(obj):
+    return obj
+
+
+def _mapping(obj):
+    return {str(k): to_plain(v) for k, v in obj.items()}
+
+
+def _sequence(obj):
+    return [to_plain(v) for v in obj]
+
+
+def _isoformat(obj):
+    return obj.isoformat()
+
+
+def _attributes(obj):
+    if hasattr(obj, "__dict__"):
+        return _mapping(vars(obj))
+    return str(obj)
+
+
+def _fields(cls):
+    """a converter reading the swagger fields of cls"""
+    names = tuple(cls.swagger_types)
+
+    def convert(obj):
+        return {name: to_plain(getattr(obj, name)) for name in names}
+
+    return convert
+
+
+def _converter(cls):
+    if cls is type(None):
+        return _identity
+    for base, convert in _BUILTINS:
+        if issubclass(cls, base):
+            # the safe dumpers only represent the exact builtin types
+            return _identity if cls is base else convert
+    if issubclass(cls, dict):
+        return _mapping
+    if issubclass(cls, (list, tuple, set, types.GeneratorType)):
+        return _sequence
+    if issubclass(cls, (datetime.date, datetime.datetime)):
+        return _isoformat
+    if isinstance(getattr(cls, "swagger_types", None), dict):
+        return _fields(cls)
+    if hasattr(cls, "to_dict"):
+        return lambda obj: to_plain(obj.to_dict())
+    return _attributes
+
+
+def to_plain(obj):
+    """converts api results into json and yaml serializable structures"""
+    cls = type(obj)
+    try:
+        convert = _CONVERTERS[cls]
+    except KeyError:
+        convert = _CONVERTERS[cls] = _converter(cls)
+    return convert(obj)
+
+
+def _yaml_dumper():
+    import yaml
+
+    return getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+def dumps(data, fmt="yaml", explicit_start=False):
+    """serializes plain data as yaml or, with jsonl, a single json line"""
+    if fmt == "jsonl":
+        return json.dumps(data, separators=(",", ":")) + "\n"
+    import yaml
+
+    return yaml.dump(data, Dumper=_yaml_dumper(), explicit_start=explicit_start)
+
+
+def write_document(data, out, fmt="yaml"):
+    """writes data as a single yaml document or json line"""
+    out.write(dumps(data, fmt, explicit_start=True))
+    out.flush()
+
+
+def stream(items, out, fmt="yaml"):
+    """writes every item as its own document as soon as it is produced
+
+    returns (success, error, count), errors raised by items are caught so
+    that the caller can still report how far the stream got.
+    """
+    count = 0
+    try:
+        for item in items:
+            write_document(to_plain(item), out, fmt)
+            count += 1
+    except Exception:
+        return False, traceback.format_exc(), count
+    return True, "", count
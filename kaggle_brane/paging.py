@@ -0,0 +1,30 @@
+"""
+iteration over all pages of the paginated list endpoints
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_pages(fetch, start=1, max_items=None):
+    """yields the items of pages start, start + 1, ... until a page is empty
+
+    while the items of one page are consumed, the next page is already
+    being fetched in the background.
+    """
+    count = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = start
+        pending = executor.submit(fetch, page)
+        while pending is not None:
+            items = pending.result()
+            if not items:
+                return
+            pending = None
+            if max_items is None or count + len(items) < max_items:
+                page += 1
+                pending = executor.submit(fetch, page)
+            for item in items:
+                if max_items is not None and count >= max_items:
+                    return
+                yield item
+                count += 1
@@ -0,0 +1,87 @@
+"""
+tuning of the connection pool shared by all requests of a KaggleApi
+
+the api calls as well as the transfers from and to storage (including the
+parallel file, segment, upload and batch workers) use the PoolManager of the
+api's rest client. by default it is sized so that every worker can keep a
+connection open instead of discarding it and handshaking again on the next
+request.
+"""
+
+import socket
+
+import urllib3
+from urllib3.connection import HTTPConnection
+
+DEFAULT_KEEPALIVE = 60
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+
+
+def socket_options(keepalive=DEFAULT_KEEPALIVE, buffer_size=None):
+    options = list(HTTPConnection.default_socket_options)
+    if keepalive:
+        # keep idle pooled connections from being dropped by middleboxes
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keepalive))
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, keepalive))
+    if buffer_size:
+        options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size))
+        options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size))
+    return options
+
+
+def _workers(env):
+    """the most connections any of the parallel paths opens at once"""
+    return max(
+        int(env.get("DOWNLOAD_WORKERS", 8)),
+        int(env.get("DOWNLOAD_SEGMENTS", 1)),
+        int(env.get("BATCH_WORKERS", 8)),
+        int(env.get("UPLOAD_WORKERS", 8)),
+    )
+
+
+def _timeout(value, default):
+    # 0 disables the timeout
+    if value is None:
+        return default
+    return float(value) or None
+
+
+def tune(api, env):
+    """applies the HTTP_* settings of env to the connection pool of api"""
+    from . import _is_set
+
+    rest = api.api_client.rest_client
+    pool_manager = rest.pool_manager
+    size = env.get("HTTP_POOL_SIZE")
+    if size:
+        size = int(size)
+    else:
+        size = max(_workers(env), pool_manager.connection_pool_kw.get("maxsize", 1))
+    keepalive = int(env.get("HTTP_KEEPALIVE", DEFAULT_KEEPALIVE))
+    buffer_size = int(env.get("HTTP_SOCKET_BUFFER", 0)) or None
+    connect = _timeout(env.get("HTTP_CONNECT_TIMEOUT"), DEFAULT_CONNECT_TIMEOUT)
+    read = _timeout(env.get("HTTP_READ_TIMEOUT"), DEFAULT_READ_TIMEOUT)
+
+    # drop pools that were created with the previous settings
+    pool_manager.clear()
+    pool_manager.connection_pool_kw.update(
+        maxsize=size,
+        block=_is_set(env.get("HTTP_POOL_BLOCK", "")),
+        socket_options=socket_options(keepalive, buffer_size),
+        timeout=urllib3.Timeout(connect=connect, read=read),
+    )
+
+    # the rest client passes an explicit timeout of None, which would
+    # override the default timeout of the pool
+    send = rest.request
+
+    def request(method, url, *args, **kwargs):
+        if kwargs.get("_request_timeout") is None:
+            kwargs["_request_timeout"] = (connect, read)
+        return send(method, url, *args, **kwargs)
+
+    rest.request = request
+    return pool_manager
@@ -0,0 +1,133 @@
+"""
+ttl cache for the responses of read-only metadata endpoints
+
+responses are keyed by endpoint and arguments and stored as json. the
+default backend is an in-process lru, which pays off in long-lived
+processes such as the daemon or a batch. with RESPONSE_CACHE_DB, responses
+are kept in a sqlite database instead, which is shared by all processes
+(and jobs) that point to the same file.
+
+the ttl of an endpoint is read from CACHE_TTL_<ENDPOINT>, e.g.
+CACHE_TTL_KERNEL_STATUS=10, a ttl of 0 disables caching for it.
+CACHE_BYPASS skips the lookup but still stores the fresh response.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .output import to_plain
+
+DEFAULT_TTLS = {
+    "competition_submissions": 30,
+    "competition_leaderboard": 60,
+    "dataset_status": 5,
+    "kernel_status": 5,
+    "list_competition_files": 300,
+    "list_dataset_files": 300,
+}
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryBackend:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, expires REAL, value TEXT)"
+            )
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, now + ttl, value),
+            )
+            self._db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+
+    def close(self):
+        self._db.close()
+
+
+_memory = MemoryBackend()
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def backend(env):
+    path = env.get("RESPONSE_CACHE_DB")
+    if not path:
+        return _memory
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = SQLiteBackend(path)
+        return _databases[path]
+
+
+def ttl(env, endpoint):
+    value = env.get("CACHE_TTL_" + endpoint.upper())
+    if value is None:
+        return DEFAULT_TTLS.get(endpoint, 0)
+    return float(value)
+
+
+def key(endpoint, args):
+    data = json.dumps([endpoint, args], sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def cached(env, endpoint, args, fetch, bypass=False):
+    """returns the plain response of fetch(), cached for the endpoint's ttl"""
+    seconds = ttl(env, endpoint)
+    if seconds <= 0:
+        return to_plain(fetch())
+    store = backend(env)
+    k = key(endpoint, args)
+    if not bypass:
+        value = store.get(k)
+        if value is not None:
+            return json.loads(value)
+    value = to_plain(fetch())
+    store.set(k, json.dumps(value), seconds)
+    return value
@@ -0,0 +1,191 @@
+"""
+rate limiting and retries for all kaggle api requests
+
+every request of a KaggleApi goes through the request method of its rest
+client, which install() wraps. before it is sent, a request takes a token
+from a bucket shared by all clients of the same account. rate limited
+responses (429) are retried after their Retry-After, server errors and
+connection errors only for idempotent methods, with exponential backoff.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+import urllib3
+
+from .metrics import phase
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+DEFAULT_RETRIES = 3
+DEFAULT_MAX_BACKOFF = 60.0
+
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# the scheduler is the only layer retrying api requests. urllib3 would
+# otherwise retry connection errors and rate limited responses that carry a
+# Retry-After below it, unseen by its counters and on top of its retries
+NO_RETRIES = urllib3.Retry(
+    total=None,
+    connect=0,
+    read=0,
+    status=0,
+    other=0,
+    redirect=5,
+    respect_retry_after_header=False,
+)
+
+_totals = dict(requests=0, retries=0, rate_limited=0, throttled=0.0)
+_totals_lock = threading.Lock()
+_buckets = dict()
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """takes a token and returns how long to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            elapsed = now - self.updated
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+            # tokens may go negative, which queues callers behind each other
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+def bucket(account, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    """the bucket shared by all clients of an account in this process"""
+    with _buckets_lock:
+        if account not in _buckets:
+            _buckets[account] = TokenBucket(rate, burst)
+        return _buckets[account]
+
+
+def retry_after(headers):
+    """seconds to wait according to a Retry-After header, if any"""
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def totals():
+    """counters of all schedulers in this process"""
+    with _totals_lock:
+        return dict(_totals, throttled=round(_totals["throttled"], 3))
+
+
+class Scheduler:
+    def __init__(
+        self,
+        token_bucket,
+        retries=DEFAULT_RETRIES,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        sleep=time.sleep,
+    ):
+        self.bucket = token_bucket
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.counters = dict(requests=0, retries=0, rate_limited=0, throttled=0.0)
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock, _totals_lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+                _totals[name] += delta
+
+    def _wait(self, seconds):
+        if seconds > 0:
+            self.sleep(seconds)
+            self._count(throttled=seconds)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, throttled=round(self.counters["throttled"], 3))
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, 1 << attempt)
+        return random.uniform(delay / 2, delay)
+
+    def _delay(self, method, error, attempt):
+        """how long to wait before retrying, None if error is final"""
+        from kaggle.rest import ApiException
+
+        if isinstance(error, ApiException) and error.status == 429:
+            self._count(rate_limited=1)
+            delay = retry_after(error.headers)
+            return delay if delay is not None else self._backoff(attempt)
+        if method.upper() not in IDEMPOTENT:
+            return None
+        if isinstance(error, ApiException):
+            # status 0 is used for ssl errors
+            if error.status == 0 or (error.status or 0) >= 500:
+                return self._backoff(attempt)
+            return None
+        if isinstance(error, (urllib3.exceptions.HTTPError, OSError)):
+            return self._backoff(attempt)
+        return None
+
+    def request(self, send, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            self._wait(self.bucket.reserve())
+            self._count(requests=1)
+            try:
+                with phase("api"):
+                    return send(method, *args, **kwargs)
+            except Exception as e:
+                delay = self._delay(method, e, attempt)
+                if delay is None or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self._count(retries=1)
+                self._wait(delay)
+
+
+def install(api, env):
+    """routes every request of api through a Scheduler, which is returned"""
+    account = api.get_config_value(api.CONFIG_NAME_USER)
+    scheduler = Scheduler(
+        bucket(
+            account,
+            rate=float(env.get("RATE_LIMIT", DEFAULT_RATE)),
+            burst=int(env.get("RATE_BURST", DEFAULT_BURST)),
+        ),
+        retries=int(env.get("API_RETRIES", DEFAULT_RETRIES)),
+        max_backoff=float(env.get("MAX_BACKOFF", DEFAULT_MAX_BACKOFF)),
+    )
+    rest = api.api_client.rest_client
+    rest.pool_manager.clear()
+    rest.pool_manager.connection_pool_kw.update(retries=NO_RETRIES)
+    send = rest.request
+
+    def request(method, *args, **kwargs):
+        return scheduler.request(send, method, *args, **kwargs)
+
+    rest.request = request
+    api.scheduler = scheduler
+    return scheduler
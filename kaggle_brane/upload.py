@@ -0,0 +1,238 @@
+"""
+parallel uploads for creating datasets and dataset versions
+
+the sdk uploads the files of a folder one after another, each through a new
+http session. Uploader.upload_files is a drop-in replacement that uploads
+them with a bounded number of workers through the connection pool of the
+api. directories are archived (dir_mode zip or tar) by the workers too,
+streaming their files into an archive in a temporary directory on disk.
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+from . import metrics
+from .lock import DIRECTORY as LOCK_DIRECTORY
+from .manifest import DEFAULT_NAME as MANIFEST_NAME
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_TRANSIENT = (urllib3.exceptions.HTTPError, OSError)
+
+
+class UploadError(IOError):
+    def __init__(self, message, report):
+        super().__init__(message)
+        self.output = dict(uploads=report)
+
+
+def _chunks(path, chunk_size):
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk_size), b""):
+            yield data
+
+
+def archive(path, dest_dir, mode):
+    """archives the directory path into dest_dir, returns the archive"""
+    name = os.path.join(dest_dir, os.path.basename(path) + "." + mode)
+    files = []
+    for root, _, names in os.walk(path):
+        files += [os.path.join(root, n) for n in sorted(names)]
+    if mode == "zip":
+        with zipfile.ZipFile(name, "w", zipfile.ZIP_DEFLATED) as z:
+            for f in files:
+                z.write(f, os.path.relpath(f, path))
+    else:
+        with tarfile.open(name, "w") as t:
+            for f in files:
+                t.add(f, os.path.relpath(f, path))
+    return name
+
+
+class _Api:
+    """the api with its upload_files replaced
+
+    the sdk's dataset_create_new and dataset_create_version run with this
+    as self, so that they upload through the uploader while everything
+    else is delegated to the api.
+    """
+
+    def __init__(self, api, uploader):
+        self._api = api
+        self.upload_files = uploader.upload_files
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def dataset_create_new(self, *args, **kwargs):
+        return type(self._api).dataset_create_new(self, *args, **kwargs)
+
+    def dataset_create_version(self, *args, **kwargs):
+        return type(self._api).dataset_create_version(self, *args, **kwargs)
+
+
+class Uploader:
+    """uploads the files of a folder
+
+    reuse maps names of top-level files or directories to the upload tokens
+    of an earlier upload of identical content, those are not uploaded again.
+    the tokens of all uploaded names are collected in tokens.
+    """
+
+    def __init__(
+        self,
+        api,
+        workers=8,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        retries=3,
+        reuse=None,
+        exclude=(),
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.reuse = reuse or dict()
+        self.exclude = set(exclude)
+        self.report = []
+        self.tokens = dict()
+        self._sdk_api = api
+        # dataset_create_new and dataset_create_version of this api upload
+        # through upload_files below
+        self.api = _Api(api, self)
+
+    @property
+    def pool(self):
+        return self._sdk_api.api_client.rest_client.pool_manager
+
+    def _put(self, path, url):
+        size = os.path.getsize(path)
+        attempt = 0
+        while True:
+            try:
+                # the body is a generator that cannot be rewound, so retries
+                # are done here rather than by urllib3
+                response = self.pool.request(
+                    "PUT",
+                    url,
+                    body=_chunks(path, self.chunk_size),
+                    headers={"Content-Length": str(size)},
+                    retries=False,
+                )
+                if response.status < 500:
+                    break
+            except _TRANSIENT:
+                pass
+            attempt += 1
+            if attempt > self.retries:
+                raise IOError("upload failed after %d attempts" % attempt)
+            time.sleep(min(1 << attempt, 30))
+        if response.status not in (200, 201):
+            raise IOError("upload failed with status %d" % response.status)
+        metrics.add("bytes_uploaded", size)
+
+    def _token(self, name, path):
+        from kaggle.models.kaggle_models_extended import FileUploadInfo
+
+        api = self._sdk_api
+        info = FileUploadInfo(
+            api.process_response(
+                api.datasets_upload_file_with_http_info(
+                    name, os.path.getsize(path), int(os.path.getmtime(path))
+                )
+            )
+        )
+        self._put(path, info.createUrl)
+        return info.token
+
+    def _upload_file(self, name, token, resources):
+        from kaggle.models.dataset_upload_file import DatasetUploadFile
+
+        api = self._sdk_api
+        upload_file = DatasetUploadFile()
+        upload_file.token = token
+        for item in resources or []:
+            if item.get("path") != name:
+                continue
+            upload_file.description = item.get("description")
+            if "schema" in item:
+                fields = api.get_or_default(item["schema"], "fields", [])
+                columns = [api.process_column(field) for field in fields]
+                for order, column in enumerate(columns):
+                    column.order = order
+                upload_file.columns = columns
+        return upload_file
+
+    def _upload(self, task, resources, tmp):
+        name, path, mode = task
+        start = time.time()
+        result = dict(file=name, bytes=0, seconds=0.0, bytes_per_second=0, error="")
+        if name in self.reuse:
+            token = self.tokens[name] = self.reuse[name]
+            upload_file_name = name + "." + mode if mode is not None else name
+            result.update(file=upload_file_name, reused=True)
+            return self._upload_file(upload_file_name, token, resources), result
+        upload_file = None
+        try:
+            if mode is not None:
+                # free the disk space of the archive as soon as it is uploaded
+                path = archive(path, tmp, mode)
+                name = result["file"] = os.path.basename(path)
+            result["bytes"] = os.path.getsize(path)
+            token = self.tokens[task[0]] = self._token(name, path)
+            upload_file = self._upload_file(name, token, resources)
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            if mode is not None and os.path.dirname(path) == tmp:
+                os.remove(path)
+        seconds = time.time() - start
+        result["seconds"] = round(seconds, 3)
+        if seconds > 0 and not result["error"]:
+            result["bytes_per_second"] = int(result["bytes"] / seconds)
+        return upload_file, result
+
+    def _tasks(self, folder, dir_mode):
+        api = self._sdk_api
+        skip = {
+            api.DATASET_METADATA_FILE,
+            api.OLD_DATASET_METADATA_FILE,
+            api.KERNEL_METADATA_FILE,
+            MANIFEST_NAME,
+            LOCK_DIRECTORY,
+        }
+        tasks = []
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name in skip or name in self.exclude:
+                continue
+            if os.path.isfile(path):
+                tasks.append((name, path, None))
+            elif os.path.isdir(path) and dir_mode in ("zip", "tar"):
+                tasks.append((name, path, dir_mode))
+        return tasks
+
+    def upload_files(self, request, resources, folder, quiet=False, dir_mode="skip"):
+        """uploads the files of folder and adds them to request.files"""
+        tasks = self._tasks(folder, dir_mode)
+        tmp = tempfile.mkdtemp(prefix="kaggle-upload")
+        try:
+            with metrics.phase("upload"), ThreadPoolExecutor(
+                max_workers=self.workers
+            ) as executor:
+                results = list(
+                    executor.map(lambda t: self._upload(t, resources, tmp), tasks)
+                )
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.report = [result for _, result in results]
+        failed = [r["file"] for r in self.report if r["error"]]
+        if failed:
+            raise UploadError("failed to upload %s" % ", ".join(failed), self.report)
+        request.files.extend(upload_file for upload_file, _ in results)
@@ -0,0 +1,64 @@
+"""
+read-only memory-mapped views of downloaded files
+
+the views are backed by the page cache, so processes on a node that map
+the same file below a DESTINATION share one copy of it instead of each
+reading it into memory of its own.
+
+    with views.view(dest, "train.csv") as data:
+        magic = bytes(data[:4])
+
+numpy is an optional dependency that is only needed for memmap.
+"""
+
+import mmap
+import os
+
+
+def path(dest, name):
+    """the path of name below dest, which it must not escape"""
+    root = os.path.realpath(dest)
+    target = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, target]) != root:
+        raise ValueError("%s is not below %s" % (name, dest))
+    return target
+
+
+class View:
+    """a read-only memoryview of a mapped file, released by close"""
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # empty files cannot be mapped
+            self._map = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            )
+        self.memoryview = memoryview(self._map if self._map is not None else b"")
+
+    def close(self):
+        self.memoryview.release()
+        if self._map is not None:
+            self._map.close()
+
+    def __enter__(self):
+        return self.memoryview
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def view(dest, name):
+    """maps the file name below dest, use as a context manager"""
+    return View(path(dest, name))
+
+
+def memmap(dest, name, dtype, shape=None, offset=0, order="C"):
+    """maps fixed-width binary data of the file name below dest as an array"""
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError("memmap requires numpy")
+    return numpy.memmap(
+        path(dest, name), dtype=dtype, mode="r", shape=shape, offset=offset, order=order
+    )
@@ -0,0 +1,79 @@
+"""
+waiting for kernels and datasets to reach a terminal state
+
+all targets are polled from one process, each on its own schedule: the
+interval doubles (with jitter) while a target's status stays the same and
+starts over when it changes, so slow runs are not polled needlessly often
+while transitions are still picked up quickly.
+"""
+
+import heapq
+import random
+import time
+
+TERMINAL = {
+    "kernels": {"complete", "error", "cancelacknowledged"},
+    "datasets": {"ready", "error"},
+}
+
+
+def backoff(attempt, initial, maximum, rng=random):
+    """exponential backoff with jitter in [delay / 2, delay]"""
+    delay = min(maximum, initial * (1 << min(attempt, 32)))
+    return rng.uniform(delay / 2, delay)
+
+
+def wait(
+    targets,
+    poll,
+    terminal,
+    mode="all",
+    timeout=None,
+    initial=1.0,
+    maximum=60.0,
+    clock=time.monotonic,
+    sleep=time.sleep,
+):
+    """polls poll(target) until all (or any) targets reached a terminal status"""
+    if mode not in ("all", "any"):
+        raise ValueError("wait for must be all or any")
+    start = clock()
+    statuses = dict()
+    polls = {target: 0 for target in targets}
+    attempts = {target: 0 for target in targets}
+    # (due, order, target), order keeps the heap stable for equal due times
+    due = [(start, i, target) for i, target in enumerate(polls)]
+    heapq.heapify(due)
+    deadline = start + timeout if timeout is not None else None
+    timed_out = False
+    while due:
+        when, i, target = heapq.heappop(due)
+        now = clock()
+        if when > now:
+            sleep(when - now)
+        status = str(poll(target))
+        polls[target] += 1
+        if status.lower() in terminal:
+            statuses[target] = status
+            if mode == "any":
+                break
+            continue
+        attempts[target] = 0 if statuses.get(target) != status else attempts[target] + 1
+        statuses[target] = status
+        now = clock()
+        if deadline is not None and now >= deadline:
+            timed_out = True
+            continue
+        delay = backoff(attempts[target], initial, maximum)
+        # the last poll is at the deadline
+        if deadline is not None:
+            delay = min(delay, deadline - now)
+        heapq.heappush(due, (now + delay, i, target))
+    return dict(
+        statuses=statuses,
+        finished=sorted(t for t, s in statuses.items() if s.lower() in terminal),
+        polls=polls,
+        total_polls=sum(polls.values()),
+        waited=round(clock() - start, 3),
+        timed_out=timed_out,
+    )
@@ -1,83 +1,113 @@
 #!/usr/bin/env python3
 import os
 import sys
-import yaml
-from pprint import pprint
+import types
 
 import kaggle_brane as kb
 
+# yaml, pprint, the daemon client and the kaggle sdk are imported lazily so
+# that every subcommand only pays for what it uses
+
+
+def _dump(output, explicit_start=False, fmt="yaml"):
+    from kaggle_brane.output import dumps
+
+    return dumps({"output": output}, fmt, explicit_start=explicit_start)
+
+
+def prepare(command, subcommand, env):
+    """resolves the function for a subcommand and the api it needs"""
+    func = kb.FUNCTIONS[command][subcommand]
+    if not getattr(func, "requires_api", True):
+        return func, None
+    return func, kb.authenticate(env)
+
+
+def run(command, subcommand, env):
+    """returns success, output, error and the metrics of the call
+
+    the metrics are None when the function ran in-process, they are only
+    final once a streamed output has been consumed and are read from
+    kaggle_brane.metrics.report() then
+    """
+    func = kb.FUNCTIONS[command][subcommand]
+    if kb.DEBUG:
+        print(func)
+    # profiles are taken of this process, so PROFILE runs in-process
+    if getattr(func, "requires_api", True) and not env.get("PROFILE"):
+        from kaggle_brane import daemon
+
+        try:
+            return daemon.call(command, subcommand, env)
+        except daemon.Unavailable as e:
+            if kb.DEBUG:
+                print("running in-process: %s" % e)
+        except (OSError, ValueError) as e:
+            # the daemon failed during the call, which must not be repeated
+            return False, None, "daemon failed: %s" % e, None
+    try:
+        func, api = prepare(command, subcommand, env)
+    except Exception as e:
+        if kb.DEBUG:
+            raise e
+        return False, None, str(e), None
+    return (*func(api, env), None)
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print(
-            yaml.dump(
+            _dump(
                 {
-                    "output": {
-                        "status": {
-                            "success": False,
-                            "error": 'must provide a command and a subcommand, e.g. "competitions list"',
-                        },
-                    }
-                },
+                    "status": {
+                        "success": False,
+                        "error": 'must provide a command and a subcommand, e.g. "competitions list"',
+                    },
+                }
             )
         )
+    elif sys.argv[1] == "daemon":
+        from kaggle_brane import daemon
+
+        # "daemon serve" keeps serving until "daemon stop" is run
+        {"serve": daemon.serve, "stop": daemon.stop}[sys.argv[2]](os.environ)
     else:
         command = sys.argv[1]
         subcommand = sys.argv[2]
-        functions = {
-            "debug": {
-                "auth": kb.debug_auth,
-            },
-            "competitions": {
-                "list": kb.list_competitions,
-                "files": kb.list_competition_files,
-                "download": kb.download_competition,
-                "submit": kb.submit_competition,
-                "submissions": kb.competition_submissions,
-                "leaderboard": kb.competition_leaderboard,
-            },
-            "datasets": {
-                "list": kb.list_dataset,
-                "files": kb.list_dataset_files,
-                "download": kb.download_dataset,
-                "create": kb.create_dataset,
-                "version": kb.dataset_version,
-                "init": kb.init_dataset,
-                "metadata": kb.dataset_metadata,
-                "status": kb.dataset_status,
-            },
-            "kernels": {
-                "list": kb.list_kernel,
-                "init": kb.init_kernel,
-                "push": kb.push_kernel,
-                "pull": kb.pull_kernel,
-                "output": kb.kernel_output,
-                "status": kb.kernel_status,
-            },
-        }
-        try:
-            api = kb.authenticate(os.environ)
-        except Exception as e:
-            if kb.DEBUG:
-                raise e
-            status = {"success": False, "error": str(e)}
-            print(yaml.dump({"output": status}))
+        env = os.environ
+        if command == "batch" and not ({"BATCH", "BATCH_FILE"} & set(env)):
+            # read the operations here so they can be forwarded to a daemon
+            env = dict(env, BATCH=sys.stdin.read())
+        fmt = env.get("OUTPUT_FORMAT", "yaml")
+        from kaggle_brane import metrics
+        from kaggle_brane import output as out
 
-        func = functions[command][subcommand]
-        if kb.DEBUG:
-            print(func)
-        success, output, error = func(api, os.environ)
+        with metrics.call(env):
+            success, output, error, measured = run(command, subcommand, env)
+            # ALL_PAGES/MAX_ITEMS, or lists as json lines: one document per
+            # item, then the status
+            streamed = isinstance(output, types.GeneratorType) or (
+                fmt == "jsonl" and isinstance(output, list)
+            )
+            if streamed:
+                success, error, count = out.stream(output, sys.stdout, fmt)
+                output = dict(count=count)
+            with metrics.phase("serialize"):
+                output = out.to_plain(output)
+        measured = measured or metrics.report()
+        if output is not None and not isinstance(output, dict):
+            output = dict(result=output)
         if kb.DEBUG:
+            from pprint import pprint
+
             pprint(dict(success=success, output=output, error=error))
-        output = output if output is not None else dict()
         status = {"success": success, "error": error}
+        requests = measured.pop("requests", None)
+        if getattr(kb.FUNCTIONS[command][subcommand], "requires_api", True):
+            from kaggle_brane import scheduler
+
+            status.update(requests=requests or scheduler.totals())
+        status.update(metrics=measured)
+        output = output if output is not None else dict()
         # status = {"status": status}
-        print(
-            yaml.dump(
-                {
-                    "output": {
-                        **status,
-                        **output,
-                    }
-                },
-            )
-        )
+        sys.stdout.write(_dump({**status, **output}, explicit_start=streamed, fmt=fmt))
@@ -2,11 +2,14 @@
 Tasks for maintaining the project.
 Execute 'invoke --list' for guidance on using Invoke
 """
+import json
 import pprint
 import shutil
+import time
 from pathlib import Path
 
 from invoke import task
+from invoke.exceptions import Exit
 
 Path().expanduser()
 
@@ -18,6 +21,8 @@ COVERAGE_FILE = ROOT_DIR.joinpath(".coverage")
 COVERAGE_DIR = ROOT_DIR.joinpath("htmlcov")
 COVERAGE_REPORT = COVERAGE_DIR.joinpath("index.html")
 PYTHON_DIRS = [str(d) for d in [SOURCE_DIR, TEST_DIR]]
+BENCHMARK_DIR = ROOT_DIR.joinpath(".benchmarks")
+STARTUP_BASELINE = BENCHMARK_DIR.joinpath("startup.json")
 
 
 def _delete_file(file):
@@ -67,6 +72,316 @@ def _create(d, *keys):
             current = current[key]
 
 
+def _import_time(stderr):
+    # sum of the cumulative times of top level imports in microseconds
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            total += int(cumulative)
+    return total
+
+
+def _startup_time(c, command, subcommand, runs, env):
+    script = "import os, run; run.prepare('{}', '{}', os.environ)".format(
+        command, subcommand
+    )
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = c.run(
+            'pipenv run python -X importtime -c "{}"'.format(script),
+            env=env,
+            replace_env=True,
+            hide=True,
+        )
+        wall = time.perf_counter() - start
+        sample = dict(wall_ms=wall * 1e3, import_ms=_import_time(result.stderr) / 1e3)
+        if best is None or sample["import_ms"] < best["import_ms"]:
+            best = sample
+    return best
+
+
+@task(
+    help=dict(
+        runs="Number of runs per subcommand, the fastest one counts (default 5)",
+        save="Store the results as the new baseline (default False)",
+        tolerance="Allowed import time regression over the baseline (default 0.25)",
+    )
+)
+def bench_startup(c, runs=5, save=False, tolerance=0.25):
+    """Benchmark the cold start time of every run.py subcommand
+    """
+    import os
+    import tempfile
+
+    import kaggle_brane as kb
+
+    results = dict()
+    with tempfile.TemporaryDirectory(prefix="kaggle-bench") as tmp:
+        # authenticating writes the credentials, keep them out of the real home
+        env = {k: v for k, v in os.environ.items() if k != "KAGGLE_CONFIG_DIR"}
+        # pipenv still finds the virtualenvs of the real home
+        env.setdefault("WORKON_HOME", str(Path.home() / ".local/share/virtualenvs"))
+        env.update(HOME=tmp, KAGGLE_USERNAME="owner", KAGGLE_KEY="key")
+        for command, subcommands in kb.FUNCTIONS.items():
+            for subcommand in subcommands:
+                name = "{} {}".format(command, subcommand)
+                results[name] = _startup_time(c, command, subcommand, int(runs), env)
+                print(
+                    "{:<24} import {:>8.1f} ms   wall {:>8.1f} ms".format(
+                        name, results[name]["import_ms"], results[name]["wall_ms"]
+                    )
+                )
+
+    if save:
+        BENCHMARK_DIR.mkdir(exist_ok=True)
+        STARTUP_BASELINE.write_text(json.dumps(results, indent=2, sort_keys=True))
+        return
+    if not STARTUP_BASELINE.exists():
+        return
+    baseline = json.loads(STARTUP_BASELINE.read_text())
+    regressions = [
+        name
+        for name, result in results.items()
+        if name in baseline
+        # a few milliseconds of slack absorb the noise on tiny import times
+        and result["import_ms"]
+        > baseline[name]["import_ms"] * (1 + float(tolerance)) + 5
+    ]
+    if regressions:
+        raise Exit("startup time regressed for: {}".format(", ".join(regressions)))
+
+
+def _competitions(n):
+    from kaggle.models.kaggle_models_extended import Competition
+
+    return [
+        Competition(
+            {
+                "ref": "competition-{}".format(i),
+                "title": "Competition {}".format(i),
+                "url": "https://www.kaggle.com/c/competition-{}".format(i),
+                "description": "Predict the outcome of event {}".format(i),
+                "deadline": "2030-01-07T23:59:00Z",
+                "category": "Featured",
+                "reward": "$10,000",
+                "teamCount": i,
+                "userHasEntered": False,
+                "tags": [{"ref": "tabular", "name": "tabular"}],
+            }
+        )
+        for i in range(n)
+    ]
+
+
+def _best_of(runs, f):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+@task(
+    help=dict(
+        items="Number of competitions in the payload (default 10000)",
+        runs="Number of runs per serializer, the fastest one counts (default 3)",
+    )
+)
+def bench_output(c, items=10000, runs=3):
+    """Benchmark the serializers of run.py on a list of competitions
+    """
+    import io
+    import yaml
+    from kaggle_brane import output
+
+    payload = _competitions(int(items))
+    runs = int(runs)
+    seconds, plain = _best_of(runs, lambda: output.to_plain(payload))
+    print("{:<24} {:>10.1f} ms".format("to_plain", seconds * 1e3))
+
+    def jsonl():
+        out = io.StringIO()
+        output.stream(plain, out, "jsonl")
+        return out.getvalue()
+
+    serializers = {
+        "yaml (python Dumper)": lambda: yaml.dump(plain),
+        "yaml (SafeDumper)": lambda: yaml.dump(plain, Dumper=yaml.SafeDumper),
+        "yaml (CSafeDumper)": lambda: output.dumps(plain),
+        "json": lambda: output.dumps(plain, "jsonl"),
+        "jsonl (streamed)": jsonl,
+    }
+    if not yaml.__with_libyaml__:
+        print("pyyaml was built without libyaml, dumps falls back to SafeDumper")
+    for name, serialize in serializers.items():
+        seconds, text = _best_of(runs, serialize)
+        print(
+            "{:<24} {:>10.1f} ms {:>10.1f} MB/s".format(
+                name, seconds * 1e3, len(text) / seconds / 1e6
+            )
+        )
+
+
+def _fixtures(root, size):
+    from kaggle_server import Fixtures, make_bundle
+
+    competition = make_bundle(str(root.joinpath("bench.zip")), size)
+    files = []
+    for i in range(4):
+        path = root.joinpath("dataset", "part-{}.csv.zip".format(i))
+        files.append(make_bundle(str(path), size // 4, files=1, nested=0))
+    return Fixtures(
+        competitions={"bench": competition},
+        datasets={"owner/bench": files},
+        kernels={"owner/kernel-{}".format(i): "complete" for i in range(100)},
+    )
+
+
+def _scenarios(dest, batch_size):
+    batch = [
+        dict(command="kernels", subcommand="status", env=dict(KERNEL=kernel))
+        for kernel in ("owner/kernel-{}".format(i % 100) for i in range(batch_size))
+    ]
+    return [
+        ("competitions", "list", dict(COMPETITION="bench", SEARCH="bench")),
+        ("competitions", "files", dict(COMPETITION="bench")),
+        (
+            "competitions",
+            "download",
+            dict(COMPETITION="bench", DESTINATION=str(dest.joinpath("competition"))),
+        ),
+        ("datasets", "files", dict(DATASET="owner/bench")),
+        (
+            "datasets",
+            "download",
+            dict(
+                DATASET="owner/bench",
+                PER_FILE="true",
+                UNZIP="true",
+                DESTINATION=str(dest.joinpath("dataset")),
+            ),
+        ),
+        ("kernels", "status", dict(KERNEL="owner/kernel-0")),
+        ("batch", "run", dict(BATCH=json.dumps(batch), CACHE_BYPASS="true")),
+    ]
+
+
+def _rate(amount, seconds):
+    return amount / seconds if amount and seconds else 0.0
+
+
+@task(
+    help=dict(
+        size="Uncompressed size of the competition bundle in MiB (default 64)",
+        latency="Seconds added to every api response (default 0.02)",
+        bandwidth="Bytes per second per storage connection, 0 for none (default 0)",
+        rate_limit_every="Answer every n-th api request with 429 (default 0)",
+        batch_size="Number of status requests of the batch scenario (default 200)",
+        rate="Client side RATE_LIMIT in requests per second, 0 for none (default 0)",
+        save="Store the results in .benchmarks/load.json (default False)",
+    )
+)
+def bench(
+    c,
+    size=64,
+    latency=0.02,
+    bandwidth=0,
+    rate_limit_every=0,
+    batch_size=200,
+    rate=0,
+    save=False,
+):
+    """Benchmark kaggle_brane functions against a local stand-in Kaggle API
+    """
+    import sys
+    import tempfile
+
+    # the server is shared with the tests
+    sys.path.insert(0, str(TEST_DIR))
+    from kaggle_server import KaggleServer
+
+    with tempfile.TemporaryDirectory(prefix="kaggle-bench") as tmp:
+        root = Path(tmp)
+        fixtures = _fixtures(root.joinpath("fixtures"), int(size) << 20)
+        server = KaggleServer(
+            fixtures,
+            latency=float(latency),
+            bandwidth=int(bandwidth) or None,
+            rate_limit_every=int(rate_limit_every) or None,
+        )
+        env = dict(
+            API_HOST=server.api_url,
+            KAGGLE_USERNAME="owner",
+            KAGGLE_KEY="key",
+            # keep the credentials out of the real home and skip any daemon
+            HOME=str(root.joinpath("home")),
+            KAGGLE_BRANE_SOCKET=str(root.joinpath("no-daemon.sock")),
+            OUTPUT_FORMAT="jsonl",
+            MAX_BACKOFF="0",
+            RATE_LIMIT=str(rate),
+        )
+        results = dict()
+        with server:
+            for command, subcommand, scenario in _scenarios(
+                root.joinpath("out"), int(batch_size)
+            ):
+                name = "{} {}".format(command, subcommand)
+                result = c.run(
+                    "pipenv run python {} {} {}".format(
+                        ROOT_DIR.joinpath("run.py"), command, subcommand
+                    ),
+                    env=dict(env, **scenario),
+                    hide=True,
+                    warn=True,
+                )
+                status = json.loads(result.stdout.strip().splitlines()[-1])["output"]
+                metrics = status["metrics"]
+                phases = metrics["phases"]
+                results[name] = dict(
+                    success=status["success"],
+                    seconds=metrics["seconds"],
+                    requests_per_second=_rate(
+                        status["requests"]["requests"], metrics["seconds"]
+                    ),
+                    download_mb_per_second=_rate(
+                        metrics.get("bytes_downloaded", 0) / 1e6,
+                        phases.get("download"),
+                    ),
+                    extract_mb_per_second=_rate(
+                        metrics.get("bytes_extracted", 0) / 1e6, phases.get("extract")
+                    ),
+                    peak_rss_mb=(metrics["peak_rss"] or 0) / 1e6,
+                )
+                print(
+                    "{:<22} {:>7} {:>8.2f} s {:>8.1f} req/s {:>8.1f} MB/s down "
+                    "{:>8.1f} MB/s extract {:>7.1f} MB rss".format(
+                        name,
+                        "ok" if status["success"] else "failed",
+                        *(
+                            results[name][k]
+                            for k in (
+                                "seconds",
+                                "requests_per_second",
+                                "download_mb_per_second",
+                                "extract_mb_per_second",
+                                "peak_rss_mb",
+                            )
+                        )
+                    )
+                )
+    if save:
+        BENCHMARK_DIR.mkdir(exist_ok=True)
+        BENCHMARK_DIR.joinpath("load.json").write_text(
+            json.dumps(results, indent=2, sort_keys=True)
+        )
+
+
 @task
 def install_hooks(c):
     """Install pre-commit hooks
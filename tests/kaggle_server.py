@@ -0,0 +1,298 @@
+"""
+a local stand-in for the kaggle api and its storage
+
+serves the endpoints behind competitions list|files|download, datasets
+files|download and kernels status from fixtures on disk. downloads are
+redirected to /storage/..., which supports range requests, so the whole
+download path (redirects, resuming, segments) runs as against kaggle.
+
+    with KaggleServer(fixtures, latency=0.01, bandwidth=50 << 20) as server:
+        env = dict(API_HOST=server.api_url, KAGGLE_USERNAME="u", KAGGLE_KEY="k")
+
+latency is added to every api response, bandwidth limits every storage
+connection to that many bytes per second and with rate_limit_every=n every
+n-th api request is answered with 429, with a Retry-After header if
+retry_after is set.
+"""
+
+import email.utils
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHUNK_SIZE = 64 << 10
+
+
+def _rows(size, seed=0):
+    """csv lines adding up to about size bytes"""
+    written = 0
+    i = 0
+    yield b"id,group,value,label\n"
+    while written < size:
+        line = b"%d,%d,%.6f,label-%d\n" % (i, (i * 7919 + seed) % 97, i / 7.0, i % 13)
+        written += len(line)
+        i += 1
+        yield line
+
+
+def _write_csv(z, name, size, seed, compression):
+    info = zipfile.ZipInfo(name, (2021, 1, 1, 0, 0, 0))
+    info.compress_type = compression
+    with z.open(info, "w") as f:
+        buffer = []
+        for line in _rows(size, seed):
+            buffer.append(line)
+            if len(buffer) == 4096:
+                f.write(b"".join(buffer))
+                buffer = []
+        f.write(b"".join(buffer))
+
+
+def make_bundle(path, size, files=4, nested=1, compression=zipfile.ZIP_DEFLATED):
+    """writes a competition bundle of about size uncompressed bytes
+
+    the bundle holds files csv files and nested zip archives with one
+    more csv file each, like the data bundles of kaggle competitions.
+    """
+    parts = files + nested
+    part_size = max(size // max(parts, 1), 1)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with zipfile.ZipFile(path, "w", compression) as z:
+        for i in range(files):
+            _write_csv(z, "file-%d.csv" % i, part_size, i, compression)
+        for i in range(nested):
+            inner = path + ".inner-%d" % i
+            with zipfile.ZipFile(inner, "w", compression) as nested_zip:
+                _write_csv(nested_zip, "nested-%d.csv" % i, part_size, i, compression)
+            z.write(inner, "nested-%d.csv.zip" % i, zipfile.ZIP_STORED)
+            os.remove(inner)
+    return path
+
+
+class Fixtures:
+    """the competitions, datasets and kernels a KaggleServer serves
+
+    competitions maps names to bundle paths, datasets maps "owner/slug" to
+    a list of file paths and kernels maps "owner/slug" to their status.
+    """
+
+    def __init__(self, competitions=None, datasets=None, kernels=None):
+        self.competitions = competitions or dict()
+        self.datasets = datasets or dict()
+        self.kernels = kernels or dict()
+
+    def storage(self, name):
+        """the file served as /storage/name"""
+        kind, _, rest = name.partition("/")
+        if kind == "competitions":
+            return self.competitions.get(rest)
+        if kind == "datasets":
+            ref, _, file_name = rest.rpartition("/")
+            for path in self.datasets.get(ref, []):
+                if os.path.basename(path) == file_name:
+                    return path
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, name):
+        self.send_response(302)
+        self.send_header("Location", "%s/storage/%s?token=x" % (self.server.url, name))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/storage/"):
+            return self._storage(url.path[len("/storage/") :])
+        if not url.path.startswith("/api/v1/"):
+            return self._send_json(dict(error="not found"), 404)
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+            limited = (
+                server.rate_limit_every
+                and server.stats["requests"] % server.rate_limit_every == 0
+            )
+            if limited:
+                server.stats["rate_limited"] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if limited:
+            headers = dict()
+            if server.retry_after is not None:
+                headers["Retry-After"] = str(server.retry_after)
+            return self._send_json(dict(error="too many requests"), 429, headers)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        for pattern, handler in _ROUTES:
+            match = re.fullmatch(pattern, url.path[len("/api/v1") :])
+            if match:
+                return handler(self, query, *match.groups())
+        self._send_json(dict(error="not found"), 404)
+
+    def _competitions_list(self, query):
+        competitions = [
+            dict(
+                ref=name,
+                title=name,
+                deadline="2030-01-01T00:00:00Z",
+                category="Featured",
+                reward="Knowledge",
+                teamCount=0,
+                userHasEntered=False,
+                tags=[],
+            )
+            for name in sorted(self.server.fixtures.competitions)
+        ]
+        page = int(query.get("page", 1))
+        self._send_json(competitions if page == 1 else [])
+
+    def _competition_files(self, query, name):
+        path = self.server.fixtures.competitions.get(name)
+        if path is None:
+            return self._send_json(dict(error="not found"), 404)
+        with zipfile.ZipFile(path) as z:
+            files = [
+                dict(ref=i.filename, name=i.filename, totalBytes=i.file_size)
+                for i in z.infolist()
+            ]
+        self._send_json(files)
+
+    def _competition_download(self, query, name):
+        if name not in self.server.fixtures.competitions:
+            return self._send_json(dict(error="not found"), 404)
+        self._redirect("competitions/" + name)
+
+    def _dataset_files(self, query, owner, slug):
+        paths = self.server.fixtures.datasets.get(owner + "/" + slug)
+        if paths is None:
+            return self._send_json(dict(error="not found"), 404)
+        files = [
+            dict(ref=os.path.basename(p), name=os.path.basename(p), totalBytes=size)
+            for p, size in ((p, os.path.getsize(p)) for p in paths)
+        ]
+        self._send_json(dict(datasetFiles=files, errorMessage=None))
+
+    def _dataset_download(self, query, owner, slug, file_name):
+        ref = owner + "/" + slug
+        if self.server.fixtures.storage("datasets/%s/%s" % (ref, file_name)) is None:
+            return self._send_json(dict(error="not found"), 404)
+        self._redirect("datasets/%s/%s" % (ref, file_name))
+
+    def _kernel_status(self, query):
+        ref = "%s/%s" % (query.get("userName"), query.get("kernelSlug"))
+        status = self.server.fixtures.kernels.get(ref)
+        if status is None:
+            return self._send_json(dict(error="not found"), 404)
+        self._send_json(dict(status=status, failureMessage=None))
+
+    def _storage(self, name):
+        path = self.server.fixtures.storage(name)
+        if path is None:
+            return self._send_json(dict(error="not found"), 404)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        self.send_response(206 if match else 200)
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, size))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header(
+            "Last-Modified", email.utils.formatdate(os.path.getmtime(path), usegmt=True)
+        )
+        self.end_headers()
+        self._send_file(path, start, end - start + 1)
+
+    def _send_file(self, path, offset, length):
+        bandwidth = self.server.bandwidth
+        started = time.monotonic()
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while sent < length:
+                data = f.read(min(CHUNK_SIZE, length - sent))
+                if not data:
+                    break
+                self.wfile.write(data)
+                sent += len(data)
+                if bandwidth:
+                    ahead = sent / bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        with self.server.lock:
+            self.server.stats["bytes_sent"] += sent
+
+
+_ROUTES = [
+    (r"/competitions/list", _Handler._competitions_list),
+    (r"/competitions/data/list/([^/]+)", _Handler._competition_files),
+    (r"/competitions/data/download-all/([^/]+)", _Handler._competition_download),
+    (r"/datasets/list/([^/]+)/([^/]+)", _Handler._dataset_files),
+    (r"/datasets/download/([^/]+)/([^/]+)/([^/]+)", _Handler._dataset_download),
+    (r"/kernels/status", _Handler._kernel_status),
+]
+
+
+class KaggleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        fixtures,
+        latency=0.0,
+        bandwidth=None,
+        rate_limit_every=None,
+        retry_after=None,
+        port=0,
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.stats = dict(requests=0, rate_limited=0, bytes_sent=0)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    @property
+    def api_url(self):
+        return self.url + "/api/v1"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import tempfile
+import threading
+import time
+
+import kaggle_brane as kb
+from kaggle_brane import aio
+
+
+def test_functions_mirror_kaggle_brane() -> None:
+    assert set(aio.FUNCTIONS) == set(kb.FUNCTIONS)
+    assert aio.kernel_status.__name__ == "kernel_status"
+    assert not aio.verify_manifest.requires_api
+
+    with tempfile.TemporaryDirectory(prefix="kaggle-aio") as dest:
+        env = dict(DESTINATION=dest)
+        success, output, error = asyncio.run(aio.verify_manifest(None, env))
+        assert not success and "no manifest" in error
+
+
+def test_concurrency_is_bounded() -> None:
+    lock = threading.Lock()
+    running = [0, 0]
+
+    @kb.wrap_error
+    def slow(api, env):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return env["N"]
+
+    call = aio._coroutine(slow)
+
+    async def main():
+        return await asyncio.gather(*(call(None, dict(N=n)) for n in range(12)))
+
+    aio.set_concurrency(3)
+    try:
+        results = asyncio.run(main())
+    finally:
+        aio.set_concurrency(aio.DEFAULT_CONCURRENCY)
+    assert [output for _, output, _ in results] == list(range(12))
+    assert running[1] == 3
+
+
+def test_generators_are_iterated_asynchronously() -> None:
+    @kb.wrap_error
+    def pages(api, env):
+        return (i for i in range(5))
+
+    async def main():
+        success, output, error = await aio._coroutine(pages)(None, dict())
+        return [item async for item in output]
+
+    assert asyncio.run(main()) == list(range(5))
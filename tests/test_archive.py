@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import tempfile
+import zipfile
+
+import pytest
+
+from kaggle_brane import archive
+
+
+def _zip_bytes(members, compression=zipfile.ZIP_DEFLATED) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=compression) as z:
+        for name, content in members.items():
+            z.writestr(name, content)
+    return buf.getvalue()
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_extract_nested_archives() -> None:
+    deep = _zip_bytes({"deep.txt": b"deep"})
+    train = _zip_bytes({"train.csv": b"a,b\n1,2\n", "nested.zip": deep})
+    test = _zip_bytes({"test.csv": b"a\n3\n"}, compression=zipfile.ZIP_STORED)
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        with zipfile.ZipFile(bundle, "w", compression=zipfile.ZIP_STORED) as z:
+            z.writestr("train.zip", train)
+            z.writestr("test.zip", test)
+            z.writestr("sample_submission.csv", b"id\n")
+
+        stats = archive.extract(bundle, dest, buffer_size=3)
+        assert _read(os.path.join(dest, "train", "train.csv")) == b"a,b\n1,2\n"
+        assert _read(os.path.join(dest, "train", "nested", "deep.txt")) == b"deep"
+        assert _read(os.path.join(dest, "test", "test.csv")) == b"a\n3\n"
+        assert _read(os.path.join(dest, "sample_submission.csv")) == b"id\n"
+        assert (stats["files"], stats["bytes"]) == (4, 8 + 4 + 4 + 3)
+        assert not os.path.exists(os.path.join(dest, "train", "nested.zip"))
+
+
+def test_extract_stays_inside_destination() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as tmp:
+        dest = os.path.join(tmp, "dest")
+        bundle = os.path.join(tmp, "evil.zip")
+        with open(bundle, "wb") as f:
+            f.write(_zip_bytes({"../../escaped.txt": b"x"}))
+        archive.extract(bundle, dest)
+        assert os.listdir(dest) == ["escaped.txt"]
+        assert not os.path.exists(os.path.join(tmp, "escaped.txt"))
+
+
+def test_parallel_extract_reports_members_in_order() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        names = ["shard-%d.zip" % i for i in range(6)]
+        with zipfile.ZipFile(bundle, "w") as z:
+            for i, name in enumerate(names):
+                z.writestr(name, _zip_bytes({"part.csv": b"x" * i}))
+            z.writestr("broken.zip", b"not a zip file")
+
+        report = archive.extract(bundle, dest, workers=3)
+        assert [m["member"] for m in report["members"]] == names + ["broken.zip"]
+        assert report["files"] == 6
+        assert report["bytes"] == sum(range(6))
+        assert [m["member"] for m in archive.failed(report)] == ["broken.zip"]
+        assert "BadZipFile" in report["members"][-1]["error"]
+        assert _read(os.path.join(dest, "shard-5", "part.csv")) == b"xxxxx"
+
+
+def test_zero_copy_extract_of_stored_members() -> None:
+    test = _zip_bytes({"test.csv": b"a\n3\n"}, compression=zipfile.ZIP_STORED)
+    train = _zip_bytes({"train.csv": b"a,b\n1,2\n"})
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        with zipfile.ZipFile(bundle, "w", compression=zipfile.ZIP_STORED) as z:
+            z.writestr("test.zip", test)
+            z.writestr("train.zip", train)
+            z.writestr("sample_submission.csv", b"id\n")
+            z.writestr("empty.csv", b"")
+
+        stats = archive.extract(bundle, dest, zero_copy=True)
+        assert _read(os.path.join(dest, "test", "test.csv")) == b"a\n3\n"
+        assert _read(os.path.join(dest, "train", "train.csv")) == b"a,b\n1,2\n"
+        assert _read(os.path.join(dest, "sample_submission.csv")) == b"id\n"
+        assert _read(os.path.join(dest, "empty.csv")) == b""
+        # train.csv is compressed and copied as before
+        assert (stats["files"], stats["zero_copy"]) == (4, 3)
+
+
+def test_zero_copy_extract_checks_crc() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        with zipfile.ZipFile(bundle, "w", compression=zipfile.ZIP_STORED) as z:
+            z.writestr("data.csv", b"0123456789")
+        with open(bundle, "r+b") as f:
+            data = f.read()
+            f.seek(data.index(b"0123456789"))
+            f.write(b"x")
+        stats = archive.extract(bundle, os.path.join(dest, "out"), zero_copy=True)
+        assert "bad crc-32" in archive.failed(stats)[0]["error"]
+        assert not os.path.exists(os.path.join(dest, "out", "data.csv"))
+
+
+def _bundle(path) -> None:
+    train = _zip_bytes({"train.csv": b"a,b\n1,2\n", "images/1.png": b"png"})
+    test = _zip_bytes({"test.csv": b"a\n3\n"}, compression=zipfile.ZIP_STORED)
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("train.zip", train)
+        z.writestr("test.zip", test)
+        z.writestr("sample_submission.csv", b"id\n")
+
+
+def test_extract_include_exclude() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        _bundle(bundle)
+        stats = archive.extract(
+            bundle, dest, include=["*.csv"], exclude=["sample_submission.csv"]
+        )
+        assert (stats["files"], stats["skipped"]) == (2, 2)
+        assert os.path.exists(os.path.join(dest, "train", "train.csv"))
+        assert os.path.exists(os.path.join(dest, "test", "test.csv"))
+        assert not os.path.exists(os.path.join(dest, "train", "images"))
+        assert not os.path.exists(os.path.join(dest, "sample_submission.csv"))
+
+
+def test_lazy_archive_extracts_on_request() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        _bundle(bundle)
+        lazy = archive.LazyArchive(bundle, dest)
+        assert lazy.names() == ["train/", "test/", "sample_submission.csv"]
+        assert sorted(os.listdir(dest)) == ["comp.zip"]
+
+        path = lazy.path("train/images/1.png")
+        assert path == os.path.join(dest, "train", "images", "1.png")
+        assert _read(path) == b"png"
+        assert _read(lazy.path("test/test.csv")) == b"a\n3\n"
+        assert not os.path.exists(os.path.join(dest, "train", "train.csv"))
+        with pytest.raises(KeyError):
+            lazy.path("train/missing.csv")
+        # no spilled archives or partial files are left behind
+        assert sorted(os.listdir(dest)) == ["comp.zip", "test", "train"]
+        assert os.listdir(os.path.join(dest, "train")) == ["images"]
+
+
+def test_extract_skips_nested_archives_outside_include(monkeypatch) -> None:
+    opened = []
+    open_archive = archive._open_archive
+
+    def recording(z, info, dest, buffer_size):
+        opened.append(info.filename)
+        return open_archive(z, info, dest, buffer_size)
+
+    monkeypatch.setattr(archive, "_open_archive", recording)
+    with tempfile.TemporaryDirectory(prefix="kaggle-archive") as dest:
+        bundle = os.path.join(dest, "comp.zip")
+        _bundle(bundle)
+        stats = archive.extract(bundle, dest, include=["test/*"])
+        assert opened == ["test.zip"]
+        assert (stats["files"], stats["skipped"]) == (1, 2)
+        assert sorted(os.listdir(dest)) == ["comp.zip", "test"]
+
+        opened.clear()
+        stats = archive.extract(bundle, dest, exclude=["train/*"])
+        assert opened == ["test.zip"]
+        assert stats["files"] == 2
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+import time
+
+from kaggle_brane import cache
+
+
+def _writer(content):
+    def write(path) -> None:
+        with open(path, "wb") as f:
+            f.write(content)
+
+    return write
+
+
+def test_version_from_headers() -> None:
+    assert cache.version({"ETag": '"abc"'}) == "abc"
+    assert cache.version({"Last-Modified": "x", "Content-Length": "3"}) == "x:3"
+    assert cache.version({"Content-Length": "3"}) is None
+
+
+def test_cache_hit_and_miss() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-cache") as tmp:
+        c = cache.DownloadCache(os.path.join(tmp, "cache"))
+        key = c.key("competitions/test-comp", "v1", "test-comp.zip")
+        assert key == c.key("competitions/test-comp", "v1", "test-comp.zip")
+        assert key != c.key("competitions/test-comp", "v2", "test-comp.zip")
+
+        outfile = os.path.join(tmp, "dest", "test-comp.zip")
+        assert not c.get(key, outfile)
+        entry = c.put(key, _writer(b"i am data"))
+        cache.materialize(entry, outfile)
+        assert c.get(key, outfile)
+        with open(outfile, "rb") as f:
+            assert f.read() == b"i am data"
+        assert os.path.samefile(entry, outfile)
+        assert c.stats() == dict(hits=1, misses=1)
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-cache") as tmp:
+        c = cache.DownloadCache(tmp, max_size=10)
+        first = c.put("a" * 64, _writer(b"12345"))
+        os.utime(first, (0, 0))
+        second = c.put("b" * 64, _writer(b"12345"))
+        os.utime(second, (1, 1))
+        third = c.put("c" * 64, _writer(b"12345"))
+        assert not os.path.exists(first)
+        assert os.path.exists(second)
+        assert os.path.exists(third)
+
+
+def test_concurrent_fills_of_an_entry_write_once() -> None:
+    writes = []
+
+    def write(path) -> None:
+        writes.append(path)
+        with open(path, "wb") as f:
+            f.write(b"1234")
+            time.sleep(0.3)
+            f.write(b"5678")
+
+    with tempfile.TemporaryDirectory(prefix="kaggle-cache") as tmp:
+        # e.g. jobs downloading a competition to different destinations
+        caches = [cache.DownloadCache(tmp) for _ in range(2)]
+        entries = []
+        threads = [
+            threading.Thread(target=lambda c=c: entries.append(c.put("a" * 64, write)))
+            for c in caches
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(writes) == 1
+        assert len(entries) == 2 and entries[0] == entries[1]
+        with open(entries[0], "rb") as f:
+            assert f.read() == b"12345678"
+        assert sorted(os.listdir(os.path.dirname(entries[0]))) == ["a" * 64]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+import pytest
+
+from kaggle_brane import convert
+
+pytest.importorskip("pyarrow")
+
+
+def _write_csv(path, rows) -> None:
+    with open(path, "w") as f:
+        f.write("id,score\n")
+        for i in range(rows):
+            f.write("%d,%f\n" % (i, i / 2))
+
+
+def test_convert_csv_in_blocks() -> None:
+    import pyarrow.parquet
+
+    with tempfile.TemporaryDirectory(prefix="kaggle-convert") as dest:
+        _write_csv(os.path.join(dest, "train.csv"), 5000)
+        os.makedirs(os.path.join(dest, "extra"))
+        _write_csv(os.path.join(dest, "extra", "test.csv"), 10)
+        report = convert.convert(dest, workers=2, block_size=4096)
+        assert report["rows"] == 5010
+        train = report["files"][0]
+        assert train["columns"] == dict(id="int64", score="double")
+        table = pyarrow.parquet.read_table(train["output"])
+        assert table.num_rows == 5000
+
+        again = convert.convert(dest, keep=False)
+        assert all(f["skipped"] for f in again["files"])
+        assert again["rows"] == 5010
+
+
+def test_convert_to_feather_and_report_errors() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-convert") as dest:
+        _write_csv(os.path.join(dest, "train.csv"), 10)
+        with open(os.path.join(dest, "broken.csv"), "w") as f:
+            f.write("a,b\n1,2\n3\n")
+        report = convert.convert(dest, fmt="feather", keep=False)
+        assert [f["file"] for f in convert.failed(report)] == [
+            os.path.join(dest, "broken.csv")
+        ]
+        assert sorted(os.listdir(dest)) == ["broken.csv", "train.feather"]
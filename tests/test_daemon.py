@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from kaggle_brane import daemon
+
+RUN = os.path.join(os.path.dirname(os.path.dirname(__file__)), "run.py")
+
+
+def test_daemon_serves_and_falls_back() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-daemon") as tmp:
+        env = dict(KAGGLE_BRANE_SOCKET=os.path.join(tmp, "daemon.sock"))
+        with pytest.raises(daemon.Unavailable):
+            daemon.call("debug", "auth", env)
+
+        server = daemon.Server(env["KAGGLE_BRANE_SOCKET"], env)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            success, output, error, _ = daemon.call("debug", "auth", env)
+            assert success
+            assert output == dict(kaggle_username="", kaggle_key="")
+            assert error == ""
+
+            other = dict(env, KAGGLE_USERNAME="someone-else")
+            with pytest.raises(daemon.Unavailable):
+                daemon.call("debug", "auth", other)
+        finally:
+            daemon.stop(env)
+            thread.join()
+            server.server_close()
+        assert not os.path.exists(env["KAGGLE_BRANE_SOCKET"])
+
+
+def test_daemon_streams_generators(monkeypatch) -> None:
+    def numbers(api, env):
+        return True, (i for i in range(3)), ""
+
+    monkeypatch.setitem(daemon.kb.FUNCTIONS, "test", {"numbers": numbers})
+    with tempfile.TemporaryDirectory(prefix="kaggle-daemon") as tmp:
+        env = dict(KAGGLE_BRANE_SOCKET=os.path.join(tmp, "daemon.sock"))
+        server = daemon.Server(env["KAGGLE_BRANE_SOCKET"], env)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            success, output, error, _ = daemon.call("test", "numbers", env)
+            assert success
+            assert list(output) == [0, 1, 2]
+        finally:
+            daemon.stop(env)
+            thread.join()
+            server.server_close()
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(api, env):
+        started.set()
+        release.wait(10)
+        return True, "slow", ""
+
+    def paths(api, env):
+        return True, dict(DESTINATION=env["DESTINATION"], FOLDER=env["FOLDER"]), ""
+
+    monkeypatch.setitem(
+        daemon.kb.FUNCTIONS,
+        "competitions",
+        dict(daemon.kb.FUNCTIONS["competitions"], slow=slow, paths=paths),
+    )
+    env = dict(KAGGLE_BRANE_SOCKET=str(tmp_path / "daemon.sock"))
+    server = daemon.Server(env["KAGGLE_BRANE_SOCKET"], env)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield env, started, release
+    finally:
+        release.set()
+        daemon.stop(env)
+        thread.join()
+        server.server_close()
+
+
+def test_daemon_serves_requests_concurrently(served) -> None:
+    env, started, release = served
+    slow = threading.Thread(target=daemon.call, args=("competitions", "slow", env))
+    slow.start()
+    assert started.wait(10)
+    # not blocked behind the slow call
+    success, output, _, _ = daemon.call("competitions", "paths", env)
+    assert success
+    release.set()
+    slow.join()
+
+
+def test_daemon_resolves_paths_against_the_client(served, tmp_path, monkeypatch):
+    env, _, _ = served
+    monkeypatch.chdir(tmp_path)
+    _, output, _, _ = daemon.call("competitions", "paths", dict(env, DESTINATION="d"))
+    assert output == dict(DESTINATION=str(tmp_path / "d"), FOLDER=str(tmp_path))
+    assert os.getcwd() == str(tmp_path)
+
+
+def test_daemon_only_serves_its_connection_settings(served) -> None:
+    env, _, _ = served
+    with pytest.raises(daemon.Unavailable):
+        daemon.call("competitions", "paths", dict(env, RATE_LIMIT="1"))
+
+
+def test_daemon_refuses_to_take_over_a_running_daemon(served) -> None:
+    env, _, _ = served
+    path = env["KAGGLE_BRANE_SOCKET"]
+    with pytest.raises(RuntimeError, match="already serving"):
+        daemon.Server(path, env)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    success, _, _, _ = daemon.call("competitions", "paths", env)
+    assert success
+
+
+def test_daemon_is_only_called_on_sockets_of_the_user(served, monkeypatch):
+    env, _, _ = served
+    uid = os.getuid()
+    with monkeypatch.context() as m:
+        m.setattr(daemon.os, "getuid", lambda: uid + 1)
+        with pytest.raises(daemon.Unavailable, match="not a socket of the user"):
+            daemon.call("competitions", "paths", env)
+
+
+def test_default_socket_is_in_a_private_directory(tmp_path, monkeypatch) -> None:
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    path = daemon.default_socket_path()
+    assert os.path.dirname(path) == str(tmp_path / ("kaggle-brane-%d" % os.getuid()))
+    server = daemon.Server(path, {})
+    try:
+        assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    finally:
+        server.server_close()
+
+    os.chmod(os.path.dirname(path), 0o755)
+    with pytest.raises(RuntimeError, match="not private"):
+        daemon.Server(path, {})
+
+
+def test_run_reports_a_daemon_failing_mid_call(tmp_path) -> None:
+    path = str(tmp_path / "daemon.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def crash():
+        connection, _ = listener.accept()
+        connection.recv(1 << 16)
+        connection.close()
+
+    thread = threading.Thread(target=crash)
+    thread.start()
+    env = dict(os.environ, KAGGLE_BRANE_SOCKET=path, KERNEL="me/train")
+    result = subprocess.run(
+        [sys.executable, RUN, "kernels", "status"],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    thread.join()
+    listener.close()
+    assert result.returncode == 0, result.stderr
+    assert "success: false" in result.stdout
+    assert "daemon failed" in result.stdout
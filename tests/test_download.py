@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+import pytest
+from urllib3.response import HTTPResponse
+from urllib3.util.retry import RequestHistory, Retry
+
+from kaggle_brane import download
+
+DATA = b"0123456789abcdefghij"
+LOCATION = "https://storage.googleapis.com/bucket/data.zip?Signature=x"
+
+
+def _response(body, status=200, headers=None) -> HTTPResponse:
+    headers = dict(headers or {})
+    headers.setdefault("Content-Length", str(len(body)))
+    return HTTPResponse(
+        body=BytesIO(body),
+        headers=headers,
+        status=status,
+        preload_content=False,
+        retries=Retry(
+            history=[RequestHistory("GET", "/api", None, 302, LOCATION)],
+        ),
+    )
+
+
+class RangePool:
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def request(self, method, url, headers=None, **kwargs) -> HTTPResponse:
+        assert (method, url) == ("GET", LOCATION)
+        start, end = headers["Range"][len("bytes=") :].split("-")
+        self.ranges.append((int(start), end))
+        end = int(end) + 1 if end else len(self.data)
+        return _response(self.data[int(start) : end], status=206)
+
+
+def test_download_resumes_part_file() -> None:
+    pool = RangePool(DATA)
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        with open(outfile + ".part", "wb") as f:
+            f.write(DATA[:4])
+        download.download(pool, _response(DATA), outfile)
+        assert pool.ranges == [(4, "")]
+        with open(outfile, "rb") as f:
+            assert f.read() == DATA
+        assert os.listdir(dest) == ["data.zip"]
+
+
+def test_download_parallel_segments() -> None:
+    pool = RangePool(DATA)
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        download.download(pool, _response(DATA), outfile, segments=3, segment_size=6)
+        assert sorted(pool.ranges) == [(0, "5"), (6, "11"), (12, "17"), (18, "19")]
+        with open(outfile, "rb") as f:
+            assert f.read() == DATA
+        assert os.listdir(dest) == ["data.zip"]
+
+
+def test_download_discards_interrupted_segments() -> None:
+    pool = RangePool(DATA)
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        # pre-sized by a segmented download that only finished its first segment
+        with open(outfile + ".part", "wb") as f:
+            f.write(DATA[:6])
+            f.truncate(len(DATA))
+        with open(outfile + ".part.segments", "w") as f:
+            f.write("[0]")
+        download.download(pool, _response(DATA), outfile)
+        assert pool.ranges == []
+        with open(outfile, "rb") as f:
+            assert f.read() == DATA
+        assert os.listdir(dest) == ["data.zip"]
+
+
+def test_download_rejects_md5_mismatch() -> None:
+    digest = base64.b64encode(hashlib.md5(b"something else").digest()).decode()
+    response = _response(DATA, headers={"x-goog-hash": "crc32c=x,md5=" + digest})
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        with pytest.raises(download.IntegrityError):
+            download.download(RangePool(DATA), response, outfile)
+        assert os.listdir(dest) == []
+
+
+class FailingBody(BytesIO):
+    def read(self, *args):
+        from urllib3.exceptions import ProtocolError
+
+        raise ProtocolError("connection reset")
+
+
+def test_download_retries_failed_first_response(monkeypatch) -> None:
+    monkeypatch.setattr(download, "_backoff", lambda attempt: None)
+    pool = RangePool(DATA)
+    response = _response(DATA)
+    response._fp = FailingBody()
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        download.download(pool, response, outfile)
+        assert pool.ranges == [(0, "")]
+        with open(outfile, "rb") as f:
+            assert f.read() == DATA
+
+
+def test_download_does_not_retry_rejected_ranges(monkeypatch) -> None:
+    monkeypatch.setattr(download, "_backoff", lambda attempt: None)
+    calls = []
+
+    class ExpiredPool:
+        def request(self, *args, **kwargs) -> HTTPResponse:
+            calls.append(args)
+            return _response(b"", status=403)
+
+    pool = ExpiredPool()
+    with tempfile.TemporaryDirectory(prefix="kaggle-download") as dest:
+        outfile = os.path.join(dest, "data.zip")
+        with open(outfile + ".part", "wb") as f:
+            f.write(DATA[:4])
+        with pytest.raises(download.DownloadError, match="status 403"):
+            download.download(pool, _response(DATA), outfile)
+        assert len(calls) == 1
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
 import os
 import tempfile
+import zipfile
 from io import BytesIO
 from unittest.mock import patch
 
@@ -22,8 +24,64 @@ def api() -> None:
     return _api
 
 
+def _download_response(method, url, headers, body, location):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not hasattr(body, "read"):
+        body = BytesIO(body)
+    else:
+        body.seek(0)
+
+    content_len = body.getbuffer().nbytes
+    print(content_len)
+
+    headers = dict(headers)
+    headers.update({"location": location})
+    headers.update({"content-length": str(content_len)})
+
+    response = HTTPResponse(
+        body=body,
+        headers=headers,
+        retries=Retry(
+            status=200,
+            history=[
+                RequestHistory(
+                    method,
+                    url,
+                    None,
+                    200,
+                    redirect_location=location,
+                )
+            ],
+        ),
+        preload_content=False,
+        status=200,
+    )
+    return response
+
+
+def _leaderboard_zip():
+    rows = [
+        "TeamId,TeamName,SubmissionDate,Score",
+        "1,alpha,2021-01-01 00:00:00,0.5",
+        "2,beta,2021-01-01 00:00:00,0.9",
+        "3,gamma,2021-01-02 00:00:00,0.7",
+        "1,alpha,2021-01-03 00:00:00,0.95",
+    ]
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        z.writestr("test-comp-publicleaderboard.csv", "\n".join(rows) + "\n")
+    return buffer.getvalue()
+
+
+UPLOADED = dict()
+VERSION = [1]
+# upload tokens the version endpoint rejects, e.g. expired ones
+REJECTED_TOKENS = set()
+
+
 def _handle_request(pool, method, url, body=None, headers=None, **kwargs):
-    if (method, url, kwargs["fields"]) == (
+    if (method, url, kwargs.get("fields")) == (
         "GET",
         "https://www.kaggle.com/api/v1/competitions/list",
         [("group", ""), ("category", ""), ("sortBy", ""), ("page", 1), ("search", "")],
@@ -31,38 +89,79 @@ def _handle_request(pool, method, url, body=None, headers=None, **kwargs):
         body = "{}"
         return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
 
-    if (method, url, kwargs["fields"]) == (
+    if (method, url, kwargs.get("fields")) == (
         "GET",
         "https://www.kaggle.com/api/v1/competitions/data/download-all/test-comp",
         [],
     ):
-        body = "i am data"
-        body = body.encode("utf-8")
-        if not hasattr(body, "read"):
-            body = BytesIO(body)
-        else:
-            body.seek(0)
-
-        content_len = body.getbuffer().nbytes
-        print(content_len)
         location = "https://storage.googleapis.com/kaggle-competitions-data/kaggle-v2/6768/44342/bundle/archive.zip?GoogleAccessId=x&Expires=1622746390&Signature=x&response-content-disposition=attachment%3B+filename%3Dweb-traffic-time-series-forecasting.zip"
+        return _download_response(method, url, headers, "i am data", location)
 
-        headers.update({"location": location})
-        headers.update({"content-length": str(content_len)})
-
-        response = HTTPResponse(
-            body=body,
-            headers=headers,
-            retries=Retry(
-                status=200,
-                history=[
-                    RequestHistory(method, url, None, 200, redirect_location=location,)
-                ],
-            ),
-            preload_content=False,
-            status=200,
+    if (method, url) == (
+        "GET",
+        "https://www.kaggle.com/api/v1/datasets/list/owner/test-data",
+    ):
+        files = [
+            {"ref": name, "name": name, "totalBytes": len(name)}
+            for name in ["a.csv", "b.csv", "readme.txt"]
+        ]
+        body = json.dumps({"datasetFiles": files, "errorMessage": None})
+        return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
+
+    if (method, url) == (
+        "GET",
+        "https://www.kaggle.com/api/v1/competitions/test-comp/leaderboard/download",
+    ):
+        location = "https://storage.googleapis.com/kaggle-leaderboards/test-comp.zip"
+        return _download_response(method, url, headers, _leaderboard_zip(), location)
+
+    prefix = "https://www.kaggle.com/api/v1/datasets/download/owner/test-data/"
+    if method == "GET" and url.startswith(prefix):
+        name = url[len(prefix) :]
+        location = "https://storage.googleapis.com/kaggle-data-sets/1/%s?X=y" % name
+        return _download_response(method, url, headers, "data of " + name, location)
+
+    prefix = "https://www.kaggle.com/api/v1/datasets/upload/file/"
+    if method == "POST" and url.startswith(prefix):
+        name = dict(kwargs["fields"])["fileName"]
+        location = "https://storage.googleapis.com/upload/%s?X=y" % name
+        body = json.dumps({"token": "token-" + name, "createUrl": location})
+        return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
+
+    prefix = "https://storage.googleapis.com/upload/"
+    if method == "PUT" and url.startswith(prefix):
+        name = url[len(prefix) :].split("?")[0]
+        UPLOADED[name] = b"".join(body)
+        return HTTPResponse(body=b"", headers=headers, status=200)
+
+    if (method, url) == ("POST", "https://www.kaggle.com/api/v1/datasets/create/new"):
+        request = json.loads(body)
+        UPLOADED["request"] = request
+        body = json.dumps({"url": "/owner/test-data", "status": "ok", "error": None})
+        return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
+
+    if (method, url) == (
+        "GET",
+        "https://www.kaggle.com/api/v1/datasets/view/owner/test-data",
+    ):
+        body = json.dumps(
+            {"ref": "owner/test-data", "currentVersionNumber": VERSION[0]}
         )
-        return response
+        return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
+
+    if (method, url) == (
+        "POST",
+        "https://www.kaggle.com/api/v1/datasets/create/version/owner/test-data",
+    ):
+        UPLOADED["request"] = json.loads(body)
+        tokens = {f["token"] for f in UPLOADED["request"]["files"]}
+        if tokens & REJECTED_TOKENS:
+            REJECTED_TOKENS.difference_update(tokens)
+            body = json.dumps({"status": "error", "error": "invalid token"})
+            return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
+        VERSION[0] += 1
+        body = json.dumps({"url": "/owner/test-data", "status": "ok", "error": None})
+        return HTTPResponse(body=body.encode("utf-8"), headers=headers, status=200)
 
     print("pool:", pool)
     print("method:", method)
@@ -112,3 +211,139 @@ def test_download_competitions(api) -> None:
             assert f.read() == "i am data".encode("utf-8")
         assert success
         assert error == ""
+
+
+@patch("urllib3.poolmanager.PoolManager.request", _handle_request)
+def test_download_dataset_files_concurrently(api) -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-dataset") as dest:
+        env = dict(
+            DATASET="owner/test-data",
+            DESTINATION=dest,
+            FILE_PATTERN="*.csv",
+            DOWNLOAD_WORKERS="2",
+        )
+        success, output, error = kb.download_dataset(api, env)
+        print("success:", success)
+        print("output:", output)
+        print("error:", error)
+        assert success
+        assert sorted(os.listdir(dest)) == ["a.csv", "b.csv"]
+        assert [f["file"] for f in output["files"]] == ["a.csv", "b.csv"]
+        assert output["bytes"] == len("data of a.csv") * 2
+        with open(os.path.join(dest, "b.csv")) as f:
+            assert f.read() == "data of b.csv"
+
+
+@patch("urllib3.poolmanager.PoolManager.request", _handle_request)
+def test_run_batch(api) -> None:
+    batch = json.dumps(
+        [
+            dict(command="competitions", subcommand="list", env=dict(COMPETITION=1)),
+            dict(command="competitions", subcommand="list"),
+            dict(command="debug", subcommand="auth", env=dict(KAGGLE_KEY="key")),
+        ]
+    )
+    success, output, error = kb.run_batch(api, dict(BATCH=batch, BATCH_WORKERS="2"))
+    print("success:", success)
+    print("output:", output)
+    print("error:", error)
+    assert not success
+    assert (output["succeeded"], output["failed"]) == (2, 1)
+    results = output["results"]
+    assert [r["success"] for r in results] == [True, False, True]
+    assert "specify competition" in results[1]["error"]
+    assert results[2]["output"] == dict(kaggle_username="", kaggle_key="key")
+
+
+@patch("urllib3.poolmanager.PoolManager.request", _handle_request)
+def test_create_dataset_uploads_concurrently(api) -> None:
+    metadata = dict(
+        title="test data", id="owner/test-data", licenses=[dict(name="CC0-1.0")]
+    )
+    with tempfile.TemporaryDirectory(prefix="kaggle-upload") as folder:
+        with open(os.path.join(folder, "dataset-metadata.json"), "w") as f:
+            json.dump(metadata, f)
+        for name in ["a.csv", "b.csv", os.path.join("images", "c.png")]:
+            os.makedirs(os.path.dirname(os.path.join(folder, name)), exist_ok=True)
+            with open(os.path.join(folder, name), "w") as f:
+                f.write("data of " + name)
+        env = dict(FOLDER=folder, DIR_MODE="zip", UPLOAD_WORKERS="3")
+        success, output, error = kb.create_dataset(api, env)
+    print("success:", success)
+    print("output:", output)
+    print("error:", error)
+    assert success
+    assert [u["file"] for u in output["uploads"]] == ["a.csv", "b.csv", "images.zip"]
+    assert all(u["error"] == "" for u in output["uploads"])
+    assert UPLOADED["a.csv"] == b"data of a.csv"
+    assert UPLOADED["images.zip"][:2] == b"PK"
+    tokens = [f["token"] for f in UPLOADED["request"]["files"]]
+    assert tokens == ["token-a.csv", "token-b.csv", "token-images.zip"]
+
+
+@patch("urllib3.poolmanager.PoolManager.request", _handle_request)
+def test_dataset_version_uploads_changed_files(api) -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-upload") as folder:
+        with open(os.path.join(folder, "dataset-metadata.json"), "w") as f:
+            json.dump(dict(id="owner/test-data"), f)
+
+        def write(name, content):
+            with open(os.path.join(folder, name), "w") as f:
+                f.write(content)
+
+        write("a.csv", "a")
+        write("b.csv", "b")
+        env = dict(FOLDER=folder, DELTA="true", VERSION_NOTES="delta")
+        success, output, error = kb.dataset_version(api, env)
+        assert success, error
+        assert output["delta"]["added"] == ["a.csv", "b.csv"]
+
+        UPLOADED.clear()
+        write("b.csv", "changed")
+        success, output, error = kb.dataset_version(api, env)
+        assert success, error
+        assert output["delta"]["changed"] == ["b.csv"]
+        assert output["delta"]["reused"] == ["a.csv"]
+        assert set(UPLOADED) == {"b.csv", "request"}
+        assert len(UPLOADED["request"]["files"]) == 2
+        with open(os.path.join(folder, ".kaggle-brane-manifest.json")) as f:
+            assert json.load(f)["version"] == VERSION[0]
+
+        # the token of a.csv expired, everything is uploaded again
+        UPLOADED.clear()
+        REJECTED_TOKENS.add("token-a.csv")
+        write("b.csv", "changed again")
+        success, output, error = kb.dataset_version(api, env)
+        assert success, error
+        assert output["delta"]["reuploaded"]
+        assert output["delta"]["reused"] == []
+        assert set(UPLOADED) == {"a.csv", "b.csv", "request"}
+
+        # a version published from elsewhere
+        VERSION[0] += 1
+        success, output, error = kb.dataset_version(api, env)
+        assert not success
+        assert "manifest" in error
+        assert output["remote_version"] == output["manifest_version"] + 1
+
+
+@patch("urllib3.poolmanager.PoolManager.request", _handle_request)
+def test_download_competition_leaderboard(api) -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-challenge") as dest:
+        env = dict(
+            COMPETITION="test-comp",
+            DESTINATION=dest,
+            DOWNLOAD="true",
+            TOP="2",
+            TEAM="gamma",
+            HISTOGRAM="2",
+        )
+        success, output, error = kb.competition_leaderboard(api, env)
+        assert error == ""
+        assert success
+        # the data of the competition is not overwritten
+        assert os.listdir(dest) == ["test-comp-leaderboard.zip"]
+        assert output["teams"] == 3
+        assert [t["team_name"] for t in output["top"]] == ["alpha", "beta"]
+        assert output["rank"]["rank"] == 3
+        assert output["histogram"]["counts"] == [1, 2]
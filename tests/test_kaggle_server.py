@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+from kaggle_server import Fixtures, KaggleServer, make_bundle
+
+import kaggle_brane as kb
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # authenticate writes the credentials to ~/.kaggle/kaggle.json
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.delenv("KAGGLE_CONFIG_DIR", raising=False)
+    fixtures = Fixtures(
+        competitions=dict(
+            comp=make_bundle(str(tmp_path / "fixtures" / "comp.zip"), 1 << 20)
+        ),
+        kernels={"me/train": "complete"},
+    )
+    with KaggleServer(fixtures, rate_limit_every=3) as server:
+        yield server
+
+
+def _env(server, **env):
+    return dict(
+        API_HOST=server.api_url,
+        KAGGLE_USERNAME="me",
+        KAGGLE_KEY="key",
+        MAX_BACKOFF="0",
+        **env
+    )
+
+
+def test_download_competition_from_server(server, tmp_path) -> None:
+    env = _env(server, COMPETITION="comp", DESTINATION=str(tmp_path / "data"))
+    api = kb.authenticate(env)
+    success, output, error = kb.download_competition(api, env)
+    assert error == ""
+    assert success
+    dest = tmp_path / "data"
+    assert sorted(os.listdir(dest)) == [
+        "comp.zip",
+        "file-0.csv",
+        "file-1.csv",
+        "file-2.csv",
+        "file-3.csv",
+        "nested-0.csv",
+    ]
+    assert output["extraction"]["files"] == 5
+
+
+def test_rate_limited_requests_are_retried(server) -> None:
+    env = _env(server, KERNEL="me/train", CACHE_BYPASS="true")
+    api = kb.authenticate(env)
+    for _ in range(4):
+        success, output, error = kb.kernel_status(api, env)
+        assert error == ""
+        assert output["status"] == "complete"
+    assert server.stats["rate_limited"] >= 1
+    assert api.scheduler.stats()["rate_limited"] == server.stats["rate_limited"]
+
+
+def test_retry_after_is_honored_by_the_scheduler(server) -> None:
+    server.retry_after = 0
+    env = _env(server, KERNEL="me/train", CACHE_BYPASS="true")
+    api = kb.authenticate(env)
+    for _ in range(4):
+        success, output, error = kb.kernel_status(api, env)
+        assert error == ""
+    stats = api.scheduler.stats()
+    assert server.stats["rate_limited"] >= 1
+    assert stats["rate_limited"] == server.stats["rate_limited"]
+    assert stats["retries"] == server.stats["rate_limited"]
+    assert stats["requests"] == server.stats["requests"]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import tempfile
+import zipfile
+
+from kaggle_brane.leaderboard import Leaderboard
+
+CSV = """TeamId,TeamName,SubmissionDate,Score
+10,alpha,2021-01-01 00:00:00,0.80
+20,beta,2021-01-01 00:00:00,0.90
+30,gamma,2021-01-01 00:00:00,0.80
+40,delta,2021-01-01 00:00:00,
+50,épsilon,2021-01-01 00:00:00,0.60
+"""
+
+
+def test_top_and_shared_ranks() -> None:
+    board = Leaderboard.from_csv(io.StringIO(CSV))
+    assert len(board) == 5
+    top = board.top(3)
+    assert [t["team_name"] for t in top] == ["beta", "alpha", "gamma"]
+    assert [t["rank"] for t in top] == [1, 2, 2]
+    assert board.rank("épsilon")["rank"] == 4
+    assert board.rank(50)["team_name"] == "épsilon"
+    # teams without a valid score are listed but not ranked
+    assert board.rank("delta") == dict(
+        rank=None, team_id=40, team_name="delta", score=None
+    )
+    assert board.rank("omega") is None
+
+
+def test_ascending_order_and_histogram() -> None:
+    board = Leaderboard.from_csv(io.StringIO(CSV), descending=False)
+    assert board.top(1)[0]["team_name"] == "épsilon"
+    assert board.rank("beta")["rank"] == 4
+    histogram = board.histogram(4)
+    assert histogram["counts"] == [1, 0, 2, 1]
+    assert histogram["edges"][0] == 0.6 and histogram["edges"][-1] == 0.9
+
+
+def test_histogram_of_equal_scores() -> None:
+    csv = "TeamId,TeamName,SubmissionDate,Score\n1,a,,0.5\n2,b,,0.5\n"
+    board = Leaderboard.from_csv(io.StringIO(csv))
+    assert board.histogram(2) == dict(edges=[0.5, 0.5], counts=[2])
+
+
+def test_load_from_zip() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-leaderboard") as tmp:
+        path = os.path.join(tmp, "test-comp-leaderboard.zip")
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("test-comp-publicleaderboard.csv", CSV)
+        board = Leaderboard.load(path)
+        assert board.top(1)[0]["team_id"] == 20
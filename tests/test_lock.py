@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from kaggle_server import Fixtures, KaggleServer, make_bundle
+
+import kaggle_brane as kb
+from kaggle_brane import lock, manifest
+
+
+def _in_threads(n, target):
+    results = [None] * n
+
+    def run(i):
+        results[i] = target()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_single_flight_runs_work_once(tmp_path) -> None:
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.3)
+        return dict(files=3)
+
+    path = str(tmp_path / "locks" / "target")
+    results = _in_threads(4, lambda: lock.single_flight(path, work, poll=0.01))
+    assert len(calls) == 1
+    assert all(output == dict(files=3) for output, _ in results)
+    reports = sorted((r for _, r in results), key=lambda r: r["reused"])
+    assert [r["reused"] for r in reports] == [False, True, True, True]
+    assert all(r["waited"] > 0 for r in reports[1:])
+    # nothing is left behind once the last of them is done
+    assert not os.path.exists(os.path.dirname(path))
+
+
+def test_single_flight_serializes_work_with_other_keys(tmp_path) -> None:
+    running = []
+    overlapped = []
+
+    def work(key):
+        running.append(key)
+        overlapped.append(len(running) > 1)
+        time.sleep(0.2)
+        running.remove(key)
+        return dict(key=key)
+
+    path = str(tmp_path / "locks" / "target")
+    keys = iter(["a", "b"])
+
+    def run():
+        key = next(keys)
+        return lock.single_flight(path, lambda: work(key), key=key, poll=0.01)
+
+    results = _in_threads(2, run)
+    assert overlapped == [False, False]
+    assert sorted(output["key"] for output, _ in results) == ["a", "b"]
+    assert not any(report["reused"] for _, report in results)
+
+
+def test_single_flight_repeats_work_after_a_failure(tmp_path) -> None:
+    path = str(tmp_path / "target")
+    lock.single_flight(path, lambda: dict(run=1))
+
+    def fail():
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        lock.single_flight(path, fail)
+    # the result of an earlier run is not reused by later calls
+    output, report = lock.single_flight(path, lambda: dict(run=3))
+    assert output == dict(run=3)
+    assert report == dict(waited=0.0, reused=False, stale_locks=0)
+
+
+def _write_lock(path, pid, host=None):
+    with open(path, "w") as f:
+        json.dump(dict(token="old", pid=pid, host=host or os.uname()[1]), f)
+
+
+def test_locks_of_dead_processes_are_broken(tmp_path) -> None:
+    path = str(tmp_path / "target.lock")
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    _write_lock(path, dead.pid)
+    held = lock.FileLock(path, poll=0.01)
+    with held:
+        assert held.broken == 1
+        assert json.load(open(path))["pid"] == os.getpid()
+    assert not os.path.exists(path)
+
+
+def test_locks_without_heartbeat_are_broken(tmp_path) -> None:
+    path = str(tmp_path / "target.lock")
+    # alive, but on another host, only its heartbeat tells
+    _write_lock(path, os.getpid(), host="elsewhere")
+    waiter = lock.FileLock(path, stale=60, timeout=0.05, poll=0.01)
+    with pytest.raises(lock.LockTimeout):
+        waiter.acquire()
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    waiter.acquire()
+    assert waiter.broken == 1
+    waiter.release()
+
+
+def test_held_locks_are_kept_fresh(tmp_path) -> None:
+    path = str(tmp_path / "target.lock")
+    with lock.FileLock(path, stale=0.2):
+        os.utime(path, (time.time() - 120, time.time() - 120))
+        time.sleep(0.2)
+        assert time.time() - os.stat(path).st_mtime < 1
+
+
+def test_manifests_skip_locks(tmp_path) -> None:
+    (tmp_path / "a.csv").write_text("a")
+    with lock.FileLock(str(tmp_path / lock.DIRECTORY / "target.lock")):
+        assert list(manifest.scan(str(tmp_path))) == ["a.csv"]
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.delenv("KAGGLE_CONFIG_DIR", raising=False)
+    fixtures = Fixtures(
+        competitions=dict(
+            comp=make_bundle(str(tmp_path / "fixtures" / "comp.zip"), 1 << 20)
+        )
+    )
+    # slow enough for the others to arrive while the first downloads
+    with KaggleServer(fixtures, bandwidth=2 << 20) as server:
+        yield server
+
+
+def test_concurrent_downloads_are_deduplicated(server, tmp_path) -> None:
+    env = dict(
+        API_HOST=server.api_url,
+        KAGGLE_USERNAME="me",
+        KAGGLE_KEY="key",
+        COMPETITION="comp",
+        DESTINATION=str(tmp_path / "data"),
+    )
+    api = kb.authenticate(env)
+    results = _in_threads(3, lambda: kb.download_competition(api, env))
+    assert all(success for success, _, _ in results)
+    reused = sorted(output["lock"]["reused"] for _, output, _ in results)
+    assert reused == [False, True, True]
+    extracted = {output["extraction"]["files"] for _, output, _ in results}
+    assert extracted == {5}
+    bundle = os.path.getsize(server.fixtures.competitions["comp"])
+    assert server.stats["bytes_sent"] == bundle
+    assert lock.DIRECTORY not in os.listdir(tmp_path / "data")
+
+    # other options to the same destination wait, but do not reuse
+    other = dict(env, INCLUDE="file-0.csv", FORCE="true")
+    results = _in_threads(
+        2, lambda e=iter([env, other]): kb.download_competition(api, dict(next(e)))
+    )
+    assert all(success for success, _, _ in results)
+    assert not any(output["lock"]["reused"] for _, output, _ in results)
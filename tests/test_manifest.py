@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+
+from kaggle_brane import manifest
+
+
+def _write(path, content) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def test_file_hash_with_and_without_mmap() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-manifest") as tmp:
+        path = os.path.join(tmp, "data.bin")
+        _write(path, b"x" * 1000)
+        expected = hashlib.sha256(b"x" * 1000).hexdigest()
+        assert manifest.file_hash(path, buffer_size=64) == expected
+        assert manifest.file_hash(path, buffer_size=1 << 20) == expected
+
+
+def test_write_and_verify() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-manifest") as dest:
+        _write(os.path.join(dest, "train.csv"), b"a,b\n1,2\n")
+        _write(os.path.join(dest, "images", "1.png"), b"png")
+        path = manifest.write(dest, "competitions/test-comp", workers=2)
+        assert os.path.basename(path) == manifest.DEFAULT_NAME
+
+        report = manifest.verify(dest)
+        assert report["valid"]
+        assert report["verified"] == 2
+        assert report["source"] == "competitions/test-comp"
+
+        _write(os.path.join(dest, "train.csv"), b"a,b\n1,3\n")
+        os.remove(os.path.join(dest, "images", "1.png"))
+        _write(os.path.join(dest, "new.txt"), b"new")
+        report = manifest.verify(dest)
+        assert not report["valid"]
+        assert report["changed"] == ["train.csv"]
+        assert report["missing"] == ["images/1.png"]
+        assert report["extra"] == ["new.txt"]
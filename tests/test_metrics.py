@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+import time
+
+import kaggle_brane as kb
+from kaggle_brane import metrics
+
+
+def test_overlapping_phases_count_wall_time() -> None:
+    def work():
+        with metrics.phase("test-overlap"):
+            time.sleep(0.2)
+
+    metrics.begin()
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    metrics.add("test_bytes", 3)
+    metrics.end()
+    report = metrics.report()
+    assert 0.2 <= report["phases"]["test-overlap"] < 0.6
+    assert report["phases"]["test-overlap"] <= report["seconds"]
+    assert report["test_bytes"] == 3
+
+
+def test_wrap_error_records_and_profiles() -> None:
+    @kb.wrap_error
+    def hashing(api, env):
+        with metrics.phase("test-hash"):
+            return sum(range(10000))
+
+    with tempfile.TemporaryDirectory(prefix="kaggle-metrics") as tmp:
+        path = os.path.join(tmp, "profile.pstats")
+        success, output, error = hashing(None, dict(PROFILE=path))
+        assert success
+        report = metrics.report()
+        assert "test-hash" in report["phases"]
+        assert report["profile"] == path
+        assert os.path.getsize(path) > 0
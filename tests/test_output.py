@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import enum
+import json
+
+import yaml
+
+from kaggle_brane import output
+
+
+class _Status(str, enum.Enum):
+    complete = "complete"
+
+
+def test_to_plain_sdk_models() -> None:
+    from kaggle.models.dataset_new_request import DatasetNewRequest
+    from kaggle.models.kaggle_models_extended import Competition
+
+    request = DatasetNewRequest(title="t", slug="s", owner_slug="o", files=[])
+    plain = output.to_plain(request)
+    assert plain == request.to_dict()
+
+    competition = Competition(
+        dict(ref="titanic", deadline="2030-01-07T23:59:00Z", tags=[])
+    )
+    plain = output.to_plain([competition])
+    assert plain == [dict(ref="titanic", deadline="2030-01-07T23:59:00", tags=[])]
+
+
+def test_dumps_plain_structures() -> None:
+    data = output.to_plain(
+        dict(
+            status=_Status.complete,
+            created=datetime.date(2021, 6, 1),
+            items=({"n": i} for i in range(2)),
+        )
+    )
+    expected = dict(status="complete", created="2021-06-01", items=[{"n": 0}, {"n": 1}])
+    assert yaml.safe_load(output.dumps(data)) == expected
+    line = output.dumps(data, fmt="jsonl")
+    assert line.endswith("\n") and json.loads(line) == expected
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+from kaggle_brane import output, paging
+
+PAGES = {1: ["a", "b"], 2: ["c", "d"], 3: ["e"]}
+
+
+def test_iter_pages_until_empty_page() -> None:
+    fetched = []
+
+    def fetch(page):
+        fetched.append(page)
+        return PAGES.get(page, [])
+
+    assert list(paging.iter_pages(fetch)) == ["a", "b", "c", "d", "e"]
+    assert fetched == [1, 2, 3, 4]
+
+
+def test_iter_pages_max_items() -> None:
+    fetched = []
+
+    def fetch(page):
+        fetched.append(page)
+        return PAGES.get(page, [])
+
+    assert list(paging.iter_pages(fetch, start=2, max_items=2)) == ["c", "d"]
+    assert fetched == [2]
+
+
+def test_stream_reports_errors() -> None:
+    def items():
+        yield {"ref": "a"}
+        raise IOError("page 2 failed")
+
+    out = io.StringIO()
+    success, error, count = output.stream(items(), out, fmt="jsonl")
+    assert not success and "page 2 failed" in error
+    assert count == 1
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [{"ref": "a"}]
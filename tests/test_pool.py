@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import socket
+from types import SimpleNamespace
+
+import urllib3
+
+from kaggle_brane import pool
+
+
+def _api():
+    calls = []
+    rest = SimpleNamespace(
+        pool_manager=urllib3.PoolManager(maxsize=4),
+        request=lambda method, url, **kwargs: calls.append(kwargs),
+    )
+    return SimpleNamespace(api_client=SimpleNamespace(rest_client=rest)), calls
+
+
+def test_tune_pool_for_parallel_workers() -> None:
+    api, calls = _api()
+    pool_manager = pool.tune(api, dict(DOWNLOAD_WORKERS="16"))
+    kw = pool_manager.connection_pool_kw
+    assert kw["maxsize"] == 16
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in kw["socket_options"]
+    assert kw["timeout"].connect_timeout == pool.DEFAULT_CONNECT_TIMEOUT
+
+    api.api_client.rest_client.request("GET", "/kernels/status", _request_timeout=None)
+    assert calls == [dict(_request_timeout=(10.0, 300.0))]
+
+
+def test_tune_pool_from_env() -> None:
+    api, calls = _api()
+    env = dict(
+        HTTP_POOL_SIZE="2",
+        HTTP_KEEPALIVE="0",
+        HTTP_SOCKET_BUFFER="65536",
+        HTTP_READ_TIMEOUT="0",
+    )
+    kw = pool.tune(api, env).connection_pool_kw
+    assert kw["maxsize"] == 2
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) not in kw["socket_options"]
+    assert (socket.SOL_SOCKET, socket.SO_RCVBUF, 65536) in kw["socket_options"]
+    assert kw["timeout"].read_timeout is None
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+
+from kaggle_brane import responses
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(status="running", calls=self.calls)
+
+
+def test_memory_backend_expires_and_evicts() -> None:
+    backend = responses.MemoryBackend(max_entries=2)
+    backend.set("a", "1", ttl=60)
+    backend.set("b", "2", ttl=-1)
+    assert backend.get("a") == "1"
+    assert backend.get("b") is None
+    backend.set("c", "3", ttl=60)
+    backend.set("d", "4", ttl=60)
+    assert backend.get("a") is None
+    assert backend.get("d") == "4"
+
+
+def test_cached_ttl_and_bypass() -> None:
+    with tempfile.TemporaryDirectory(prefix="kaggle-responses") as tmp:
+        env = dict(RESPONSE_CACHE_DB=os.path.join(tmp, "responses.db"))
+        fetch = Counter()
+        args = ["user", "owner/kernel"]
+        first = responses.cached(env, "kernel_status", args, fetch)
+        assert responses.cached(env, "kernel_status", args, fetch) == first
+        assert fetch.calls == 1
+
+        # another process sharing the database sees the same entry
+        other = responses.SQLiteBackend(env["RESPONSE_CACHE_DB"])
+        assert other.get(responses.key("kernel_status", args)) is not None
+        other.close()
+
+        refreshed = responses.cached(env, "kernel_status", args, fetch, bypass=True)
+        assert refreshed == dict(status="running", calls=2)
+        assert responses.cached(env, "kernel_status", args, fetch) == refreshed
+
+        disabled = dict(env, CACHE_TTL_KERNEL_STATUS="0")
+        responses.cached(disabled, "kernel_status", args, fetch)
+        assert fetch.calls == 3
+        responses.backend(env).close()
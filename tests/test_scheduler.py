@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from kaggle.rest import ApiException
+
+from kaggle_brane import scheduler
+
+
+class Responses:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _error(status, headers=None) -> ApiException:
+    error = ApiException(status=status, reason="error")
+    error.headers = headers
+    return error
+
+
+def test_token_bucket_throttles_after_burst() -> None:
+    now = [0.0]
+    bucket = scheduler.TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+
+
+def test_scheduler_retries_and_counts() -> None:
+    slept = []
+    s = scheduler.Scheduler(scheduler.TokenBucket(0, 1), sleep=slept.append)
+    send = Responses(_error(429, {"Retry-After": "7"}), _error(503), "ok")
+    assert s.request(send, "GET", "/competitions/list") == "ok"
+    assert slept[0] == 7.0
+    assert 1.0 <= slept[1] <= 2.0
+    stats = s.stats()
+    assert (stats["requests"], stats["retries"], stats["rate_limited"]) == (3, 2, 1)
+    assert stats["throttled"] == round(sum(slept), 3)
+
+    # server errors are final for requests that are not idempotent
+    send = Responses(_error(503), "ok")
+    with pytest.raises(ApiException):
+        s.request(send, "POST", "/competitions/submit")
+    assert send.calls == 1
+
+    send = Responses(*[_error(500)] * 5)
+    with pytest.raises(ApiException):
+        s.request(send, "GET", "/kernels/status")
+    assert send.calls == s.retries + 1
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+
+import pytest
+
+from kaggle_brane import views
+
+
+def test_view_is_read_only(tmp_path) -> None:
+    (tmp_path / "train.csv").write_bytes(b"a,b\n1,2\n")
+    (tmp_path / "empty.csv").write_bytes(b"")
+    with views.view(str(tmp_path), "train.csv") as data:
+        assert data.readonly
+        assert bytes(data[:4]) == b"a,b\n"
+        with pytest.raises(TypeError):
+            data[0] = 0
+    with views.view(str(tmp_path), "empty.csv") as data:
+        assert len(data) == 0
+
+
+def test_view_stays_inside_destination(tmp_path) -> None:
+    (tmp_path / "secret").write_bytes(b"x")
+    os.makedirs(tmp_path / "dest")
+    with pytest.raises(ValueError):
+        views.view(str(tmp_path / "dest"), "../secret")
+
+
+def test_memmap(tmp_path) -> None:
+    numpy = pytest.importorskip("numpy")
+    (tmp_path / "data.bin").write_bytes(struct.pack("<4i", 1, 2, 3, 4))
+    array = views.memmap(str(tmp_path), "data.bin", "<i4", shape=(2, 2))
+    assert not array.flags.writeable
+    assert numpy.array_equal(array, [[1, 2], [3, 4]])
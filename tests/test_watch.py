@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from kaggle_brane import watch
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _statuses(**sequences):
+    sequences = {k: list(v) for k, v in sequences.items()}
+
+    def poll(target):
+        sequence = sequences[target]
+        return sequence.pop(0) if len(sequence) > 1 else sequence[0]
+
+    return poll
+
+
+def test_wait_for_all() -> None:
+    clock = FakeClock()
+    poll = _statuses(a=["queued", "running", "complete"], b=["running", "error"])
+    output = watch.wait(
+        ["a", "b"],
+        poll,
+        watch.TERMINAL["kernels"],
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert output["statuses"] == dict(a="complete", b="error")
+    assert output["finished"] == ["a", "b"]
+    assert output["polls"] == dict(a=3, b=2)
+    assert output["total_polls"] == 5
+    assert not output["timed_out"]
+
+
+def test_wait_for_any_and_timeout() -> None:
+    clock = FakeClock()
+    poll = _statuses(a=["running"], b=["running", "running", "complete"])
+    output = watch.wait(
+        ["a", "b"],
+        poll,
+        watch.TERMINAL["kernels"],
+        mode="any",
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert output["finished"] == ["b"]
+    assert output["statuses"]["a"] == "running"
+
+    clock = FakeClock()
+    output = watch.wait(
+        ["a"],
+        _statuses(a=["running"]),
+        watch.TERMINAL["kernels"],
+        timeout=30,
+        maximum=8,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert output["timed_out"]
+    assert output["finished"] == []
+    # the interval backs off 1, 2, 4, 8, 8, ... (halved at most by jitter)
+    assert 5 <= output["polls"]["a"] <= 13
+    # the last poll is at the deadline, not before it
+    assert output["waited"] == 30
+
+
+def test_wait_polls_until_the_timeout() -> None:
+    clock = FakeClock()
+    output = watch.wait(
+        ["a", "b"],
+        _statuses(a=["running"], b=["queued"]),
+        watch.TERMINAL["kernels"],
+        timeout=100,
+        initial=60,
+        maximum=60,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert output["timed_out"]
+    assert output["waited"] == 100